@@ -0,0 +1,186 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+BATCHED_METHODS = ('predict', 'predict_proba', 'decision_function')
+
+# guards restarting the dispatcher threads in a forked child, recreated in the child since the
+# parent may fork while another thread holds it
+_fork_lock = threading.Lock()
+
+
+def _reset_locks_after_fork():
+    global _fork_lock
+    _fork_lock = threading.Lock()
+    BatchingPredictor._shared_lock = threading.Lock()
+
+
+class BatchingPredictor:
+
+    """
+    Wrapper of a model coalescing the predict calls made concurrently by several threads (explainers
+    running in the same worker) into one call over the stacked rows.
+
+    A background thread waits at most max_wait seconds after the first pending call for other calls
+    of the same method, up to max_batch_size rows, calls the model once and scatters the results back
+    to the callers. Calls with max_batch_size rows or more go straight to the model. Any other
+    attribute is read from the wrapped model. A process forked with the wrapper (a process pool)
+    starts its own background thread on its first call.
+    """
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, model, max_batch_size=10_000, max_wait=0.005):
+        """
+
+        :param model: The model whose predict, predict_proba and decision_function calls are batched.
+        :param max_batch_size: Maximum number of rows of a coalesced call.
+        :param max_wait: Maximum time in seconds a call waits for other calls to join its batch.
+        """
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._start()
+
+    @classmethod
+    def shared(cls, key, model, **kwargs):
+        """
+        Return the BatchingPredictor of key in this process, so that tasks explaining the same model
+        (key is usually the model file digest) share their batches.
+        """
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(model, **kwargs)
+            return cls._shared[key]
+
+    def _start(self):
+        self._requests = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name=f'{self.__class__.__name__}', daemon=True)
+        self._thread.start()
+
+    def __getattr__(self, name):
+        model = self.__dict__.get('model')
+        if name in BATCHED_METHODS and hasattr(model, name):
+            return partial(self._submit, name)
+        if model is None:
+            raise AttributeError(name)
+        return getattr(model, name)
+
+    def __getstate__(self):
+        return {'model': self.model, 'max_batch_size': self.max_batch_size, 'max_wait': self.max_wait}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._pid != os.getpid():
+            # the thread of the parent process does not exist here
+            self._closed = True
+            return
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._requests.put(None)
+        self._thread.join()
+
+    def _submit(self, method, x):
+        if self._pid != os.getpid():
+            with _fork_lock:
+                if self._pid != os.getpid():
+                    self._start()
+        if len(x) >= self.max_batch_size:
+            return getattr(self.model, method)(x)
+        future = Future()
+        with self._lock:
+            # requests are queued before the closing sentinel or not at all
+            closed = self._closed
+            if not closed:
+                self._requests.put((method, x, future))
+        if closed:
+            return getattr(self.model, method)(x)
+        return future.result()
+
+    def _run(self):
+        pending = deque()
+        while True:
+            request = pending.popleft() if pending else self._requests.get()
+            if request is None:
+                break
+
+            method, batch, n_rows = request[0], [request], len(request[1])
+            for other in [other for other in pending if other is not None and other[0] == method]:
+                if n_rows + len(other[1]) <= self.max_batch_size:
+                    pending.remove(other)
+                    batch.append(other)
+                    n_rows += len(other[1])
+
+            deadline = time.perf_counter() + self.max_wait
+            while n_rows < self.max_batch_size:
+                try:
+                    other = self._requests.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    break
+                if other is None:
+                    pending.append(other)
+                    break
+                if other[0] != method or n_rows + len(other[1]) > self.max_batch_size:
+                    # served by a later batch, in arrival order
+                    pending.append(other)
+                    continue
+                batch.append(other)
+                n_rows += len(other[1])
+
+            self._predict(method, batch)
+
+        for method, x, future in (request for request in pending if request is not None):
+            try:
+                future.set_result(getattr(self.model, method)(x))
+            except Exception as e:
+                future.set_exception(e)
+
+    def _predict(self, method, batch):
+        try:
+            inputs = [x for _, x, _ in batch]
+            if all(isinstance(x, pd.DataFrame) for x in inputs):
+                stacked = pd.concat(inputs, ignore_index=True)
+            else:
+                stacked = np.concatenate([np.asarray(x) for x in inputs])
+            predictions = getattr(self.model, method)(stacked)
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        start = 0
+        for _, x, future in batch:
+            future.set_result(predictions[start:start + len(x)])
+            start += len(x)
+
+
+def unwrap_model(model):
+    """
+    Return the model wrapped by a BatchingPredictor, for the explainers that inspect the model itself.
+    """
+    return model.model if isinstance(model, BatchingPredictor) else model
+
+
+os.register_at_fork(after_in_child=_reset_locks_after_fork)
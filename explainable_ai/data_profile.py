@@ -0,0 +1,316 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class DataProfile:
+
+    """
+    Statistical profile of a datasource computed in a single pass over its rows.
+
+    It keeps per-column moments, exact min/max, approximate quantiles (taken from a uniform
+    row sample), category frequencies, and a background sample stratified by the target.
+    The profile is stored next to the datasource file so explainers can reuse it instead of
+    scanning the whole datasource on every task.
+    """
+
+    version = 1
+    file_suffix = '.profile.json'
+    quantile_levels = np.linspace(0, 1, 101)
+
+    def __init__(self, n_rows, columns, dtypes, moments, quantiles, frequencies,
+                 sample, background, target_name=None):
+        """
+
+        :param n_rows: Number of rows in the datasource.
+        :param columns: Column names in datasource order.
+        :param dtypes: A dictionary of column name to pandas dtype string.
+        :param moments: A dictionary of numeric column name to count, mean, std, min and max.
+        :param quantiles: A dictionary of numeric column name to the values at quantile_levels.
+        :param frequencies: A dictionary of non-numeric column name to {category: count}.
+        :param sample: A pandas DataFrame with a uniform row sample.
+        :param background: A pandas DataFrame with a row sample stratified by the target.
+        :param target_name: The target column used to stratify the background sample.
+        """
+        self.n_rows = n_rows
+        self.columns = list(columns)
+        self.dtypes = dtypes
+        self.moments = moments
+        self.quantiles = quantiles
+        self.frequencies = frequencies
+        self.sample = sample
+        self.background = background
+        self.target_name = target_name
+
+    @classmethod
+    def path_for(cls, uri):
+        return str(uri) + cls.file_suffix
+
+    @classmethod
+    def from_frame(cls, data, target_name=None, **kwargs):
+        return cls.from_chunks([data], target_name=target_name, **kwargs)
+
+    @classmethod
+    def from_csv(cls, path, target_name=None, chunksize=100_000, **kwargs):
+        return cls.from_chunks(pd.read_csv(path, chunksize=chunksize, index_col=False),
+                               target_name=target_name, **kwargs)
+
+    @classmethod
+    def from_chunks(cls, chunks, target_name=None, sample_size=10_000, background_size=1_000,
+                    max_strata=50, max_categories=1_000, random_state=None):
+        """
+        Build a profile from an iterable of pandas DataFrames sharing the same columns.
+
+        Samples are kept with the random-key reservoir method, so memory is bounded by
+        sample_size and background_size rows (per target class) whatever the datasource size.
+        Category frequencies are kept for the non-numeric columns with at most max_categories
+        distinct values; columns going over it (identifiers, free text) are left out of frequencies.
+        Column types are fixed by the first chunk: a numeric column read as another type in a later
+        chunk is coerced, its non-numeric values counted as missing.
+        If target_name is None the last column is used as target.
+        """
+        rng = np.random.default_rng(random_state)
+
+        n_rows = 0
+        columns = dtypes = numeric = None
+        moments, frequencies, high_cardinality = {}, {}, set()
+        sample = sample_keys = None
+        strata, target_counts = {}, {}
+
+        for chunk in chunks:
+            if columns is None:
+                columns = chunk.columns.tolist()
+                dtypes = {col: str(dtype) for col, dtype in chunk.dtypes.items()}
+                numeric = chunk.select_dtypes(include='number').columns.tolist()
+                target_name = target_name if target_name is not None else columns[-1]
+            if chunk.empty:
+                continue
+            chunk = _coerce_numeric(chunk, numeric)
+            n_rows += len(chunk)
+
+            for col in numeric:
+                _merge_moments(moments.setdefault(col, _empty_moments()), chunk[col])
+
+            for col in columns:
+                if col not in numeric and col not in high_cardinality:
+                    _merge_counts(frequencies.setdefault(col, {}), chunk[col])
+                    if len(frequencies[col]) > max_categories:
+                        del frequencies[col]
+                        high_cardinality.add(col)
+
+            keys = rng.random(len(chunk))
+            sample, sample_keys = _keep_smallest(sample, sample_keys, chunk, keys, sample_size)
+
+            if strata is not None:
+                _merge_counts(target_counts, chunk[target_name])
+                if len(target_counts) > max_strata:
+                    strata = None
+                else:
+                    for label, idx in chunk.groupby(target_name, sort=False).indices.items():
+                        frame, frame_keys = strata.get(label, (None, None))
+                        strata[label] = _keep_smallest(frame, frame_keys, chunk.iloc[idx], keys[idx],
+                                                       background_size)
+
+        if columns is None:
+            raise ValueError(f'{cls.__name__} can not profile a datasource without columns')
+
+        if sample is None:
+            sample = pd.DataFrame(columns=columns)
+        quantiles = {}
+        for col in numeric:
+            stats = moments[col]
+            stats['std'] = float(np.sqrt(stats.pop('m2') / (stats['count'] - 1))) if stats['count'] > 1 else 0.0
+            values = np.array(sample[col].quantile(cls.quantile_levels), dtype=float)
+            if values.size:
+                values[0], values[-1] = stats['min'], stats['max']
+            quantiles[col] = values.tolist()
+
+        background = _stratified_background(sample, strata, target_counts, n_rows, background_size, rng)
+
+        return cls(n_rows=n_rows,
+                   columns=columns,
+                   dtypes=dtypes,
+                   moments=moments,
+                   quantiles=quantiles,
+                   frequencies=frequencies,
+                   sample=sample.reset_index(drop=True),
+                   background=background.reset_index(drop=True),
+                   target_name=target_name)
+
+    def info_data(self, columns=None):
+        """
+        Return the mean, std, min and max of the given numeric columns in the format used by NoiseSet.
+        By default all numeric columns but the target are used.
+        """
+        if columns is None:
+            columns = [col for col in self.moments if col != self.target_name]
+        return {stat: pd.Series([self.moments[col][stat] for col in columns], index=columns)
+                for stat in ('mean', 'std', 'min', 'max')}
+
+    def sample_frame(self, columns=None):
+        return self.sample if columns is None else self.sample[list(columns)]
+
+    def background_frame(self, columns=None):
+        return self.background if columns is None else self.background[list(columns)]
+
+    def lime_training_stats(self, columns):
+        """
+        Return the training_data_stats expected by lime_tabular.LimeTabularExplainer for a
+        quartile discretization of the given numeric columns.
+
+        Bin borders and bounds come from the profile quantiles, while the per-bin moments and
+        frequencies are estimated on the uniform sample.
+        """
+        stats = {key: {} for key in ('bins', 'means', 'stds', 'mins', 'maxs',
+                                     'feature_values', 'feature_frequencies')}
+        quartiles = [25, 50, 75]
+        for idx, col in enumerate(columns):
+            qts = np.unique([self.quantiles[col][q] for q in quartiles])
+            values = self.sample[col].to_numpy(dtype=float)
+            values = values[~np.isnan(values)]
+            binned = np.searchsorted(qts, values)
+            n_bins = len(qts) + 1
+
+            stats['bins'][idx] = qts.tolist()
+            stats['means'][idx] = [float(values[binned == b].mean()) if np.any(binned == b) else 0.
+                                   for b in range(n_bins)]
+            stats['stds'][idx] = [float(values[binned == b].std()) + 1e-11 if np.any(binned == b) else 1e-11
+                                  for b in range(n_bins)]
+            stats['mins'][idx] = [self.moments[col]['min']] + qts.tolist()
+            stats['maxs'][idx] = qts.tolist() + [self.moments[col]['max']]
+            stats['feature_values'][idx] = list(range(n_bins))
+            stats['feature_frequencies'][idx] = np.bincount(binned, minlength=n_bins).tolist()
+        return stats
+
+    def to_dict(self):
+        return {'version': self.version,
+                'n_rows': self.n_rows,
+                'target_name': self.target_name,
+                'columns': self.columns,
+                'dtypes': self.dtypes,
+                'moments': self.moments,
+                'quantile_levels': self.quantile_levels.tolist(),
+                'quantiles': self.quantiles,
+                'frequencies': {col: [[_to_builtin(k), v] for k, v in counts.items()]
+                                for col, counts in self.frequencies.items()},
+                'sample': _frame_to_dict(self.sample),
+                'background': _frame_to_dict(self.background)}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != cls.version:
+            raise ValueError(f"{cls.__name__} can not read profile version {data.get('version')}")
+        return cls(n_rows=data['n_rows'],
+                   columns=data['columns'],
+                   dtypes=data['dtypes'],
+                   moments=data['moments'],
+                   quantiles=data['quantiles'],
+                   frequencies={col: dict((k, v) for k, v in counts)
+                                for col, counts in data['frequencies'].items()},
+                   sample=_frame_from_dict(data['sample'], data['dtypes']),
+                   background=_frame_from_dict(data['background'], data['dtypes']),
+                   target_name=data['target_name'])
+
+    def save(self, path):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def load_for(cls, uri):
+        """
+        Load the profile stored next to the datasource uri, or return None if there is none.
+        """
+        path = cls.path_for(uri)
+        if not os.path.isfile(path):
+            return None
+        return cls.load(path)
+
+
+def _empty_moments():
+    return {'count': 0, 'mean': 0.0, 'm2': 0.0, 'min': np.inf, 'max': -np.inf}
+
+
+def _coerce_numeric(chunk, numeric):
+    mismatched = [col for col in numeric if not pd.api.types.is_numeric_dtype(chunk[col].dtype)]
+    if not mismatched:
+        return chunk
+    chunk = chunk.copy(deep=False)
+    for col in mismatched:
+        chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+    return chunk
+
+
+def _merge_moments(stats, values):
+    # Chan et al. pairwise update, stable for long streams of chunks
+    values = values.dropna().to_numpy(dtype=float)
+    n_b = len(values)
+    if n_b == 0:
+        return
+    mean_b = values.mean()
+    m2_b = ((values - mean_b) ** 2).sum()
+    n_a = stats['count']
+    n = n_a + n_b
+    delta = mean_b - stats['mean']
+    stats['mean'] = float(stats['mean'] + delta * n_b / n)
+    stats['m2'] = float(stats['m2'] + m2_b + delta ** 2 * n_a * n_b / n)
+    stats['count'] = int(n)
+    stats['min'] = float(min(stats['min'], values.min()))
+    stats['max'] = float(max(stats['max'], values.max()))
+
+
+def _merge_counts(counts, values):
+    for value, count in values.value_counts().items():
+        counts[value] = counts.get(value, 0) + int(count)
+
+
+def _keep_smallest(frame, keys, chunk, chunk_keys, size):
+    if frame is not None:
+        chunk = pd.concat([frame, chunk])
+        chunk_keys = np.concatenate([keys, chunk_keys])
+    if len(chunk_keys) > size:
+        idx = np.argpartition(chunk_keys, size)[:size]
+        chunk, chunk_keys = chunk.iloc[idx], chunk_keys[idx]
+    return chunk, chunk_keys
+
+
+def _stratified_background(sample, strata, class_counts, n_rows, size, rng):
+    if not strata:
+        if len(sample) <= size:
+            return sample
+        return sample.iloc[rng.choice(len(sample), size, replace=False)]
+
+    parts = []
+    for label, (frame, keys) in strata.items():
+        n_label = max(1, int(round(size * class_counts.get(label, 0) / n_rows)))
+        parts.append(frame.iloc[np.argsort(keys)[:n_label]])
+    return pd.concat(parts)
+
+
+def _to_builtin(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _frame_to_dict(frame):
+    return {'columns': frame.columns.tolist(),
+            'data': frame.astype(object).where(frame.notna(), None).values.tolist()}
+
+
+def _frame_from_dict(data, dtypes):
+    frame = pd.DataFrame(data['data'], columns=data['columns'])
+    for col in frame.columns:
+        if dtypes.get(col) not in (None, 'object'):
+            try:
+                frame[col] = frame[col].astype(dtypes[col])
+            except (TypeError, ValueError):
+                # missing values in an integer column, keep the inferred dtype
+                pass
+    return frame
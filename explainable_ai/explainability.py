@@ -1,11 +1,109 @@
+import contextlib
+import copy
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
 import pandas as pd
-import shap
 import numpy as np
-import matplotlib.pyplot as plt
-from explainer.gpx import GPX
-from lime import lime_tabular
+from sklearn.ensemble import (RandomForestClassifier, RandomForestRegressor, ExtraTreesClassifier,
+                              ExtraTreesRegressor, GradientBoostingClassifier, GradientBoostingRegressor)
+from sklearn.linear_model import LinearRegression, Ridge, Lasso, ElasticNet, LogisticRegression
+from sklearn.tree import DecisionTreeClassifier, DecisionTreeRegressor
+from .batching_predictor import unwrap_model
+from .lime_batch import BatchLimeTabular
+from .registry import register
 from .understand_ai import Understanding
 
+# models handled by the model specific SHAP engines
+SHAP_TREE_MODELS = (DecisionTreeClassifier, DecisionTreeRegressor,
+                    RandomForestClassifier, RandomForestRegressor,
+                    ExtraTreesClassifier, ExtraTreesRegressor,
+                    GradientBoostingClassifier, GradientBoostingRegressor)
+SHAP_LINEAR_MODELS = (LinearRegression, Ridge, Lasso, ElasticNet, LogisticRegression)
+SHAP_ENGINES = ('auto', 'tree', 'linear', 'permutation', 'partition', 'exact')
+# folder of the plots of the explanation tasks, served by the API as <task_id>.png
+OUTPUT_FOLDER = os.getenv('XAI_OUTPUT_FOLDER', 'storage/output')
+
+GP_HYPER_PARAMETERS = {
+    'gplearn': {'population_size': 20,
+                'generations': 50,
+                'stopping_criteria': 0.00001,
+                'p_crossover': 0.5,
+                'p_subtree_mutation': 0.2,
+                'p_hoist_mutation': 0.1,
+                'p_point_mutation': 0.2,
+                'const_range': (-5.0, 5.0),
+                'parsimony_coefficient': 0.01,
+                'init_depth': (2, 3),
+                'n_jobs': -1,
+                'low_memory': True,
+                'function_set': ('add', 'sub', 'mul', 'div')},
+    'operon': {'local_iterations': 100,
+               'allowed_symbols': 'add,sub,mul,aq,constant,variable',
+               'generations': 100,
+               'mutation_probability': 0.2,
+               'crossover_probability': 1.0,
+               'crossover_internal_probability': 0.9,
+               'population_size': 100,
+               'max_length': 15,
+               'objectives': ['mse'],
+               'max_depth': 15,
+               'tournament_size': 10,
+               'epsilon': 1e-20,
+               'reinserter': 'keep-best',
+               'offspring_generator': 'basic'}
+}
+
+# overrides of GP_HYPER_PARAMETERS for each preset, 'balanced' keeps the defaults
+GP_PRESETS = {
+    'gplearn': {'fast': {'population_size': 20, 'generations': 10},
+                'balanced': {},
+                'accurate': {'population_size': 100, 'generations': 200}},
+    'operon': {'fast': {'population_size': 50, 'generations': 20, 'local_iterations': 20, 'max_length': 10},
+               'balanced': {},
+               'accurate': {'population_size': 300, 'generations': 300, 'local_iterations': 200, 'max_length': 25}}
+}
+
+
+class GPWarmStartArchive:
+
+    """
+    Solvers evolved for the previous instances of an understanding, used to warm start the evolution
+    of nearby instances.
+    """
+
+    def __init__(self, max_size=32):
+        self.instances = deque(maxlen=max_size)
+        self.solvers = deque(maxlen=max_size)
+
+    def add(self, instance, solver):
+        self.instances.append(np.asarray(instance, dtype=float))
+        self.solvers.append(solver)
+
+    def nearest(self, instance):
+        if not self.instances:
+            return None
+        distances = np.linalg.norm(np.asarray(self.instances) - np.asarray(instance, dtype=float), axis=1)
+        return self.solvers[int(np.argmin(distances))]
+
+
+# GPWarmStartArchive of the understandings warm started last in this worker, the least recently used is dropped
+GP_WARM_START_MAX_ARCHIVES = 16
+gp_warm_start_archives = OrderedDict()
+_gp_warm_start_lock = threading.Lock()
+
+
+def gp_warm_start_archive(key, max_archives=GP_WARM_START_MAX_ARCHIVES):
+    with _gp_warm_start_lock:
+        archive = gp_warm_start_archives.pop(key, None) or GPWarmStartArchive()
+        gp_warm_start_archives[key] = archive
+        while len(gp_warm_start_archives) > max_archives:
+            gp_warm_start_archives.popitem(last=False)
+        return archive
+
 
 class Explanation(Understanding):
 
@@ -13,36 +111,87 @@ class Explanation(Understanding):
                  arguments_used,
                  model_to_understand=None,
                  data_source=None,
-                 mode=None):
+                 mode=None,
+                 profile=None,
+                 feature_names=None,
+                 explainer_cache=None,
+                 cache_key=None):
 
         """
 
         :param arguments_used:
         :param model_to_understand:
         :param data_source:
+        :param mode:
+        :param profile: A DataProfile of the data source. When defined, explainers take their
+        statistics and background samples from it instead of the data source.
         :param feature_names:
-        :param target_name:
+        :param explainer_cache: An ExplainerCache used to reuse the constructed explainer between tasks.
+        :param cache_key: A key identifying the model and the data source, usually built with
+        ExplainerCache.make_key from their file digests. The cache is used only if it is defined.
         """
 
-        super().__init__(arguments_used, model_to_understand, data_source )
+        super().__init__(arguments_used, model_to_understand, data_source, feature_names)
         self.mode = mode
-
-
+        self.profile = profile
+        self.explainer_cache = explainer_cache
+        self.cache_key = cache_key
+        # held while self.explainer runs, a cached explainer being shared by the tasks of the process
+        self._explainer_lock = threading.RLock()
+
+    def _cached_explainer(self, factory, **params):
+        if self.explainer_cache is None or self.cache_key is None:
+            self._explainer_lock = threading.RLock()
+            return factory()
+        key = self.explainer_cache.make_key(self.cache_key, self.__class__.__name__,
+                                            feature_names=self.feature_names,
+                                            mode=self.mode,
+                                            profile=self.profile is not None,
+                                            **params)
+        explainer, self._explainer_lock = self.explainer_cache.get_or_create_locked(key, factory)
+        return explainer
+
+
+@register('gpx')
 class GeneticProgrammingExplainer(Explanation):
 
     def __init__(self, arguments_used, model_to_understand, data_source,
-                 mode='classification', gp_solver='operon',  num_samples=500):
-        super().__init__(arguments_used, model_to_understand, data_source, mode)
+                 mode='classification', gp_solver='operon',  num_samples=500,
+                 explainer_cache=None, cache_key=None, preset='balanced',
+                 time_budget=None, max_evaluations=None, warm_start_key=None):
+        """
+
+        :param preset: Hyperparameter preset of the solver, one of 'fast', 'balanced' or 'accurate'.
+        :param time_budget: Wall-clock budget in seconds of each evolution (operon only).
+        :param max_evaluations: Maximum number of fitness evaluations of each evolution.
+        :param warm_start_key: Key of the archive of evolved solvers used by warm starts, by default the cache_key.
+        """
+        super().__init__(arguments_used, model_to_understand, data_source, mode,
+                         explainer_cache=explainer_cache, cache_key=cache_key)
         self.num_samples = num_samples
+        self.preset = preset
+        self.time_budget = time_budget
+        self.max_evaluations = max_evaluations
+        self.warm_start_key = warm_start_key if warm_start_key is not None else cache_key
         self.explainer = None
         self.gp_solver = gp_solver
-        self.explainer = GPX(x=self.data_source[self.feature_names[:-1]],
-                             y=self.data_source[self.feature_names[-1]],
-                             model_predict=self.model_to_understand.predict,
-                             gp_model=self.gp_solver,
-                             noise_set_num_samples=self.num_samples,
-                             diff_as_numpy=False,
-                             feature_names=self.feature_names)
+        self.explainer = self._cached_explainer(self._build_explainer,
+                                                gp_solver=gp_solver,
+                                                num_samples=self.num_samples,
+                                                preset=self.preset,
+                                                time_budget=self.time_budget,
+                                                max_evaluations=self.max_evaluations)
+
+    def _build_explainer(self, gp_model=None):
+        from explainer.gpx import GPX
+
+        return GPX(x=self.data_source[self.feature_names[:-1]],
+                   y=self.data_source[self.feature_names[-1]],
+                   model_predict=self.model_to_understand.predict,
+                   gp_model=gp_model if gp_model is not None else self.gp_solver,
+                   noise_set_num_samples=self.num_samples,
+                   diff_as_numpy=False,
+                   feature_names=self.feature_names)
 
     @property
     def gp_solver(self):
@@ -52,52 +201,91 @@ class GeneticProgrammingExplainer(Explanation):
     def gp_solver(self, gp_solver):
         if gp_solver == 'gplearn':
             from gplearn.genetic import SymbolicRegressor
-            gp_hyper_parameters = {'population_size': 20,
-                                   'generations': 50,
-                                   'stopping_criteria': 0.00001,
-                                   'p_crossover': 0.5,
-                                   'p_subtree_mutation': 0.2,
-                                   'p_hoist_mutation': 0.1,
-                                   'p_point_mutation': 0.2,
-                                   'const_range': (-5.0, 5.0),
-                                   'parsimony_coefficient': 0.01,
-                                   'init_depth': (2, 3),
-                                   'n_jobs': -1,
-                                   'low_memory': True,
-                                   'function_set': ('add', 'sub', 'mul', 'div')}
-            self._gp_solver = SymbolicRegressor(**gp_hyper_parameters)
         elif gp_solver == "operon":
             from pyoperon.sklearn import SymbolicRegressor
-            gp_hyper_parameters = {
-                'local_iterations': 100,
-                'allowed_symbols': 'add,sub,mul,aq,constant,variable',
-                'generations': 100,
-                'mutation_probability': 0.2,
-                'crossover_probability': 1.0,
-                'crossover_internal_probability': 0.9,
-                'population_size': 100,
-                'max_length': 15,
-                'objectives': ['mse'],
-                'max_depth': 15,
-                'tournament_size': 10,
-                'epsilon': 1e-20,
-                'reinserter': 'keep-best',
-                'offspring_generator': 'basic'
-            }
-            self._gp_solver = SymbolicRegressor(**gp_hyper_parameters)
         else:
             raise ValueError('Genetic Programming solver does not exist')
 
+        self.gp_solver_name = gp_solver
+        self._gp_solver_class = SymbolicRegressor
+        self._gp_solver = self._new_gp_solver(self.preset, self.time_budget, self.max_evaluations)
+
+    def _new_gp_solver(self, preset, time_budget, max_evaluations):
+        return self._gp_solver_class(**self._gp_hyper_parameters(preset, time_budget, max_evaluations))
+
+    def _gp_hyper_parameters(self, preset, time_budget, max_evaluations):
+        presets = GP_PRESETS[self.gp_solver_name]
+        if preset not in presets:
+            raise ValueError(f'{self.__class__.__name__} does not know the preset {preset}, '
+                             f'use one of {list(presets)}')
+
+        gp_hyper_parameters = {**GP_HYPER_PARAMETERS[self.gp_solver_name], **presets[preset]}
+        if self.gp_solver_name == 'operon':
+            if time_budget is not None:
+                gp_hyper_parameters['time_limit'] = max(1, int(time_budget))
+            if max_evaluations is not None:
+                gp_hyper_parameters['max_evaluations'] = int(max_evaluations)
+        else:
+            if time_budget is not None:
+                raise ValueError(f'{self.__class__.__name__} supports time_budget only with the operon solver, '
+                                 f'use max_evaluations with gplearn')
+            if max_evaluations is not None:
+                gp_hyper_parameters['generations'] = max(1, int(max_evaluations) //
+                                                         gp_hyper_parameters['population_size'])
+        return gp_hyper_parameters
+
+    def _warm_start_solver(self, instance, base_solver):
+        if self.gp_solver_name != 'gplearn':
+            # operon does not keep the population between fits
+            raise ValueError(f"{self.__class__.__name__} supports warm start only with gp_solver='gplearn', "
+                             f"not with gp_solver='{self.gp_solver_name}'")
+        if self.warm_start_key is None:
+            raise ValueError(f'{self.__class__.__name__} needs a warm_start_key or a cache_key to warm start')
+
+        archive = gp_warm_start_archive(self.warm_start_key)
+        nearest = archive.nearest(instance)
+        if nearest is None:
+            return archive, copy.deepcopy(base_solver)
+
+        # continue the evolution of the nearest instance population for a fraction of the generations
+        solver = copy.deepcopy(nearest)
+        extra_generations = max(1, base_solver.generations // 4)
+        solver.set_params(warm_start=True, generations=len(solver._programs) + extra_generations)
+        return archive, solver
+
     def _uai_feature_importance(self, *args, **kwargs):
         instance = kwargs.get('instance')
+        preset = kwargs.get('preset')
+        time_budget = kwargs.get('time_budget')
+        max_evaluations = kwargs.get('max_evaluations')
+        warm_start = kwargs.get('warm_start', False)
+
         if instance is not None:
-            self.explainer.instance_understanding(instance)
+            archive = None
+            solver = None
+            if preset is not None or time_budget is not None or max_evaluations is not None:
+                # solver of this call only, the explainer keeps its own settings and cached explainer
+                solver = self._new_gp_solver(preset or self.preset,
+                                             time_budget if time_budget is not None else self.time_budget,
+                                             max_evaluations if max_evaluations is not None else self.max_evaluations)
+            if warm_start:
+                archive, solver = self._warm_start_solver(instance, solver or self._gp_solver)
+            explainer = self._build_explainer(solver) if solver is not None else self.explainer
+
             names = []
             values = []
 
-            for k, v in self.explainer.derivatives_generate(instance, as_numpy=False).items():
-                names.append(k)
-                values.append(v)
+            with self._explainer_lock if explainer is self.explainer else contextlib.nullcontext():
+                start = time.perf_counter()
+                explainer.instance_understanding(instance)
+                self.evolution_time = time.perf_counter() - start
+
+                if archive is not None:
+                    archive.add(instance, copy.deepcopy(solver))
+
+                for k, v in explainer.derivatives_generate(instance, as_numpy=False).items():
+                    names.append(k)
+                    values.append(v)
 
             return values, names
 
@@ -106,20 +294,106 @@ class GeneticProgrammingExplainer(Explanation):
             raise ValueError(f"{self.__class__.__name__} must of a instance")
 
 
+@register('lime')
 class LocalExplanation(Explanation):
     def __init__(self, arguments_used, model_to_understand,
-                 data_source, mode='classification'):
-        super().__init__(arguments_used, model_to_understand, data_source, mode)
+                 data_source, mode='classification', profile=None, feature_names=None,
+                 explainer_cache=None, cache_key=None, kernel_width=None, discretize_continuous=True,
+                 random_state=None, sampler='random'):
+        """
+
+        :param kernel_width: Width of the LIME exponential kernel, by default 0.75 * sqrt(n_features).
+        :param discretize_continuous: If True continuous features are discretized into quartiles.
+        :param random_state: Seed of the perturbations.
+        :param sampler: Sampler of the perturbations of the vectorized LIME, 'random', 'sobol' or 'lhs'.
+        """
+        super().__init__(arguments_used, model_to_understand, data_source, mode, profile, feature_names,
+                         explainer_cache, cache_key)
 
         self.mode = mode
-        x_lime = self.data_source[self.feature_names[:-1]].values
-        self.explainer = lime_tabular.LimeTabularExplainer(training_data=x_lime,
-                                                           mode=self.mode,
-                                                           feature_names=self.feature_names)
+        self.kernel_width = kernel_width
+        self.discretize_continuous = discretize_continuous
+        self.random_state = random_state
+        self.sampler = sampler
+        self.explainer = None
+        self._batch_explainer = None
+        self._configure()
+
+    def _configure(self, kernel_width=None, discretize_continuous=None):
+        if kernel_width is not None:
+            self.kernel_width = kernel_width
+        if discretize_continuous is not None:
+            self.discretize_continuous = discretize_continuous
+        self.explainer = self._cached_explainer(self._build_explainer,
+                                                kernel_width=self.kernel_width,
+                                                discretize_continuous=self.discretize_continuous,
+                                                random_state=self.random_state)
+        self._batch_explainer = None
+
+    def _build_explainer(self):
+        from lime import lime_tabular
+
+        x_names = self.feature_names[:-1]
+        if self.profile is not None:
+            return lime_tabular.LimeTabularExplainer(training_data=self.profile.sample_frame(x_names).values,
+                                                     mode=self.mode,
+                                                     feature_names=self.feature_names,
+                                                     kernel_width=self.kernel_width,
+                                                     discretize_continuous=self.discretize_continuous,
+                                                     training_data_stats=self.profile.lime_training_stats(x_names),
+                                                     random_state=self.random_state)
+        x_lime = self.data_source[x_names].values
+        return lime_tabular.LimeTabularExplainer(training_data=x_lime,
+                                                 mode=self.mode,
+                                                 feature_names=self.feature_names,
+                                                 kernel_width=self.kernel_width,
+                                                 discretize_continuous=self.discretize_continuous,
+                                                 random_state=self.random_state)
+
+    def _build_batch_explainer(self):
+        x_names = self.feature_names[:-1]
+        if self.profile is not None:
+            info_data = self.profile.info_data(x_names)
+            means, stds = info_data['mean'].values, info_data['std'].values
+            bins = [np.unique([self.profile.quantiles[col][q] for q in (25, 50, 75)]) for col in x_names]
+        else:
+            x_lime = self.data_source[x_names].values.astype(float)
+            means, stds = x_lime.mean(axis=0), x_lime.std(axis=0)
+            bins = [np.unique(np.percentile(x_lime[:, j], [25, 50, 75])) for j in range(x_lime.shape[1])]
+        return BatchLimeTabular(means, stds,
+                                feature_names=x_names,
+                                mode=self.mode,
+                                kernel_width=self.kernel_width,
+                                discretize=self.discretize_continuous,
+                                bins=bins,
+                                # as in LIME, discretized features are perturbed over the whole training distribution
+                                sample_around_instance=not self.discretize_continuous,
+                                random_state=self.random_state,
+                                sampler=self.sampler)
+
+    @property
+    def batch_explainer(self):
+        if self._batch_explainer is None:
+            self._batch_explainer = self._build_batch_explainer()
+        return self._batch_explainer
 
     def _uai_generate_table(self, *args, **kwargs):
+        """
+        Explain one instance with LimeTabularExplainer, or a batch of instances with the vectorized
+        BatchLimeTabular, which returns a dictionary of arrays instead of a lime Explanation.
+        With adaptive, each instance of the batch starts with initial_samples perturbations, doubled
+        until its surrogate converges, num_samples being the limit.
+        """
         instance = kwargs.get('instance')
+        instances = kwargs.get('instances')
         n_features = kwargs.get('n_features')
+        num_samples = kwargs.get('num_samples') or 5000
+        kernel_width = kwargs.get('kernel_width')
+        discretize_continuous = kwargs.get('discretize_continuous')
+
+        if (kernel_width is not None and kernel_width != self.kernel_width) or \
+                (discretize_continuous is not None and discretize_continuous != self.discretize_continuous):
+            self._configure(kernel_width, discretize_continuous)
 
         if self.mode == 'classification':
             predict = self.model_to_understand.predict_proba
@@ -128,30 +402,124 @@ class LocalExplanation(Explanation):
         else:
             raise ValueError(f'{self.__class__.__name__} class doesnt handle with {self.mode} type')
 
+        if instances is not None:
+            if kwargs.get('sampler') is not None:
+                self.batch_explainer.sampler = kwargs.get('sampler')
+            if kwargs.get('adaptive'):
+                return self.batch_explainer.explain_adaptive(np.asarray(instances, dtype=float),
+                                                             predict,
+                                                             initial_samples=kwargs.get('initial_samples') or 500,
+                                                             max_samples=num_samples,
+                                                             tolerance=kwargs.get('tolerance') or 0.01,
+                                                             convergence=kwargs.get('convergence') or 'fidelity',
+                                                             labels=kwargs.get('labels'),
+                                                             max_rows=kwargs.get('max_rows'))
+            return self.batch_explainer.explain(np.asarray(instances, dtype=float),
+                                                predict,
+                                                num_samples=num_samples,
+                                                labels=kwargs.get('labels'),
+                                                max_rows=kwargs.get('max_rows'))
         if instance is not None and n_features:
-            return self.explainer.explain_instance(instance,
-                                                   predict,
-                                                   num_features=n_features
-                                                   )
+            with self._explainer_lock:
+                return self.explainer.explain_instance(instance,
+                                                       predict,
+                                                       num_features=n_features,
+                                                       num_samples=num_samples
+                                                       )
         else:
             raise ValueError(f'{self._uai_generate_table.__name__} method '
                              f'in {self.__class__.__name__} class missing argument')
 
 
+@register('shap')
 class ShapValuesExplanation(Explanation):
-    def __init__(self, arguments_used, model_to_understand, data_source, max_samples=5000):
-        super().__init__(arguments_used, model_to_understand, data_source)
-
-        self.data_source.set_axis(self.feature_names, axis=1)
+    def __init__(self, arguments_used, model_to_understand, data_source, max_samples=5000,
+                 profile=None, feature_names=None, engine='auto', explainer_cache=None, cache_key=None):
+        super().__init__(arguments_used, model_to_understand, data_source, profile=profile,
+                         feature_names=feature_names, explainer_cache=explainer_cache, cache_key=cache_key)
 
-        x_shap = self.data_source[self.feature_names[:-1]]
+        if self.profile is not None:
+            x_shap = self.profile.background_frame(self.feature_names[:-1])
+        else:
+            self.data_source.set_axis(self.feature_names, axis=1)
+            x_shap = self.data_source[self.feature_names[:-1]]
         self.max_samples = max_samples
+        self.engine = self._select_engine(engine)
+        self.explainer = self._cached_explainer(lambda: self._build_explainer(x_shap),
+                                                engine=self.engine,
+                                                max_samples=self.max_samples)
+
+    def _select_engine(self, engine):
+        """
+        Choose the SHAP engine. With 'auto', trees and forests use the TreeExplainer, linear models
+        the LinearExplainer and any other model the model agnostic PermutationExplainer.
+        """
+        if engine not in SHAP_ENGINES:
+            raise ValueError(f"{self.__class__.__name__} class doesnt know "
+                             f"how to handle with SHAP engine: {engine}")
+        if engine != 'auto':
+            return engine
+        model = unwrap_model(self.model_to_understand)
+        if isinstance(model, SHAP_TREE_MODELS):
+            return 'tree'
+        if isinstance(model, SHAP_LINEAR_MODELS):
+            return 'linear'
+        return 'permutation'
+
+    def _build_explainer(self, x_shap):
+        import shap
+
+        if self.engine == 'tree':
+            # path dependent perturbation uses the training cover stored in the trees, no background needed
+            return shap.explainers.Tree(unwrap_model(self.model_to_understand),
+                                        feature_perturbation='tree_path_dependent')
+
+        if self.engine == 'partition':
+            background = shap.maskers.Partition(x_shap, max_samples=self.max_samples)
+            return shap.explainers.Partition(self.model_to_understand.predict, background)
 
         background = shap.maskers.Independent(x_shap, max_samples=self.max_samples)
-        self.explainer = shap.explainers.Exact(self.model_to_understand.predict, background)
+        if self.engine == 'linear':
+            return shap.explainers.Linear(unwrap_model(self.model_to_understand), background)
+        if self.engine == 'permutation':
+            return shap.explainers.Permutation(self.model_to_understand.predict, background)
+        return shap.explainers.Exact(self.model_to_understand.predict, background)
+
+    @staticmethod
+    def _single_output(explanation):
+        # multi-output models (e.g. classifiers explained by TreeExplainer) are explained for the predicted output
+        if explanation.values.ndim > 1:
+            output = int(np.argmax(explanation.base_values + explanation.values.sum(axis=0)))
+            return explanation[:, output]
+        return explanation
+
+    def shap_values(self, instances):
+        """
+        Compute the SHAP values of a batch of instances with a single explainer call.
+
+        :param instances: An array-like with shape (n_instances, n_features).
+        :return: A dictionary with the engine used, the feature names, the SHAP values with shape
+        (n_instances, n_features) or (n_instances, n_features, n_outputs) and the base values.
+        """
+        instances = pd.DataFrame(np.atleast_2d(np.asarray(instances, dtype=float)),
+                                 columns=self.feature_names[:-1])
+        with self._explainer_lock:
+            shap_values = self.explainer(instances)
+        return {"engine": self.engine,
+                "feature_names": list(self.feature_names[:-1]),
+                "values": np.asarray(shap_values.values, dtype=np.float32),
+                "base_values": np.asarray(shap_values.base_values, dtype=np.float32)}
 
     def _uai_feature_importance(self, *args, **kwargs):
+        shap_type_xai = kwargs.get("shap_type_xai")
         instance = kwargs.get("instance")
+        instances = kwargs.get("instances")
+
+        if shap_type_xai == "raw":
+            if instances is None and instance is None:
+                raise ValueError(f"{self.__class__.__name__} class can' t execut method "
+                                 f"feature_importance without instance or instances")
+            return self.shap_values(instances if instances is not None else [instance])
 
         if instance is None:
             raise ValueError(f"{self.__class__.__name__} class can' t execut method "
@@ -159,23 +527,30 @@ class ShapValuesExplanation(Explanation):
         else:
             instance = pd.DataFrame([instance], columns=self.feature_names[:-1])
 
-        shap_type_xai = kwargs.get("shap_type_xai")
-
+        import shap
+        import matplotlib.pyplot as plt
 
         if shap_type_xai == "waterfall":
-            shap_values = self.explainer(instance)
-            shap.plots.waterfall(shap_values[0])
+            with self._explainer_lock:
+                shap_values = self.explainer(instance)
+            shap.plots.waterfall(self._single_output(shap_values[0]), show=False)
 
         elif shap_type_xai == "bar":
-            shap_values = self.explainer(instance)
-            shap.plots.bar(shap_values[0])
+            with self._explainer_lock:
+                shap_values = self.explainer(instance)
+            shap.plots.bar(self._single_output(shap_values[0]), show=False)
 
         else:
             raise ValueError(f"{self.__class__.__name__} class doesnt know "
                              f"how to handle with shap_type: {shap_type_xai}")
 
-        plt.savefig(f"{shap_type_xai}.png")
+        # the plot of a task is its result file in OUTPUT_FOLDER, so concurrent tasks do not overwrite each other's plot
+        output_path = kwargs.get("output_path")
+        if output_path is None:
+            output_dir = kwargs.get("output_dir") or OUTPUT_FOLDER
+            os.makedirs(output_dir, exist_ok=True)
+            output_path = os.path.join(output_dir, f"{kwargs.get('task_id') or uuid.uuid4().hex}.png")
+        plt.savefig(output_path)
         plt.close()
 
-
-
+        return {"engine": self.engine, "file": output_path}
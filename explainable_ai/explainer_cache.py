@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import pickle
+import sys
+import threading
+import types
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+try:
+    # cloudpickle (a shap dependency) also serializes the lambdas kept by lime discretizers
+    import cloudpickle as serializer
+except ImportError:
+    serializer = pickle
+
+# objects shared with the rest of the process, not counted in the size of an explainer
+_SHARED_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+def estimate_size(obj, limit=None):
+    """
+    Estimate the memory held by obj without serializing it: the buffers of the numpy arrays and
+    pandas objects reachable from it plus the size of the other python objects. Functions, bound
+    methods (the model behind model_predict) and modules are not counted.
+
+    :param limit: If defined, the walk stops as soon as the size exceeds it.
+    """
+    size = 0
+    seen = set()
+    stack = [obj]
+    while stack and (limit is None or size <= limit):
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, _SHARED_TYPES):
+            continue
+        seen.add(id(item))
+
+        if isinstance(item, np.ndarray):
+            size += item.nbytes
+        elif isinstance(item, (pd.DataFrame, pd.Series, pd.Index)):
+            usage = item.memory_usage(index=True)
+            size += int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+        elif isinstance(item, dict):
+            size += sys.getsizeof(item)
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            size += sys.getsizeof(item)
+            stack.extend(item)
+        else:
+            size += sys.getsizeof(item)
+            if hasattr(item, '__dict__'):
+                stack.append(vars(item))
+            for slot in getattr(type(item), '__slots__', ()):
+                if isinstance(slot, str) and hasattr(item, slot):
+                    stack.append(getattr(item, slot))
+    return size
+
+
+class ExplainerCache:
+
+    """
+    Two-tier cache for constructed explainers (LimeTabularExplainer, SHAP explainers, GPX).
+
+    The first tier is an in-memory LRU bounded by the estimated size of its entries, the second
+    tier keeps the serialized explainers on disk, so a worker restart or an entry evicted from
+    memory is restored without rebuilding the explainer. Explainers larger than the memory cap are
+    not cached in either tier.
+
+    The cached explainers are shared by the callers of the process: get_or_create_locked returns
+    the explainer with its lock, held by the caller while it runs or changes the explainer.
+    """
+
+    def __init__(self, max_memory_mb=512, cache_dir=None):
+        """
+
+        :param max_memory_mb: Memory cap of the in-memory tier, measured with estimate_size.
+        :param cache_dir: Directory of the on-disk tier. If None only the in-memory tier is used.
+        """
+        self.max_memory_bytes = int(max_memory_mb * 1024 * 1024)
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        """
+        Create the cache configured by XAI_EXPLAINER_CACHE_MB and XAI_EXPLAINER_CACHE_DIR.
+        """
+        return cls(max_memory_mb=float(os.getenv('XAI_EXPLAINER_CACHE_MB', 512)),
+                   cache_dir=os.getenv('XAI_EXPLAINER_CACHE_DIR'))
+
+    @staticmethod
+    def make_key(*parts, **params):
+        """
+        Build a cache key from digests (model file, datasource file, ...) and constructor parameters.
+        """
+        payload = json.dumps([parts, params], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @property
+    def memory_bytes(self):
+        return self._memory_bytes
+
+    def __contains__(self, key):
+        return key in self._entries or (self._disk_path(key) is not None and os.path.isfile(self._disk_path(key)))
+
+    def get(self, key):
+        entry = self._get(key)
+        return entry[0] if entry is not None else None
+
+    def put(self, key, explainer):
+        self._put(key, explainer)
+
+    def get_or_create(self, key, factory):
+        return self.get_or_create_locked(key, factory)[0]
+
+    def get_or_create_locked(self, key, factory):
+        """
+        The explainer cached under key, created with factory if missing, and the lock that guards it.
+        An explainer that is not cached gets a lock of its own.
+        """
+        entry = self._get(key)
+        if entry is None:
+            explainer = factory()
+            entry = (explainer, self._put(key, explainer) or threading.RLock())
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._memory_bytes = 0
+
+    def _get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                explainer, _, lock = self._entries[key]
+                return explainer, lock
+
+        path = self._disk_path(key)
+        if path is None or not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as f:
+            explainer = pickle.load(f)
+        lock = self._remember(key, explainer, estimate_size(explainer, limit=self.max_memory_bytes))
+        return explainer, lock or threading.RLock()
+
+    def _put(self, key, explainer):
+        size = estimate_size(explainer, limit=self.max_memory_bytes)
+        if size > self.max_memory_bytes:
+            return None
+
+        path = self._disk_path(key)
+        if path is not None:
+            try:
+                data = serializer.dumps(explainer)
+            except Exception:
+                # explainers that can not be serialized are kept in memory only
+                data = None
+            if data is not None:
+                tmp_path = f'{path}.{os.getpid()}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+
+        return self._remember(key, explainer, size)
+
+    def _disk_path(self, key):
+        if self.cache_dir is None:
+            return None
+        return os.path.join(self.cache_dir, f'{key}.pkl')
+
+    def _remember(self, key, explainer, size):
+        """
+        Keep explainer in the in-memory tier.
+
+        :return: The new lock of the explainer, or None if it is too large to be kept.
+        """
+        if size > self.max_memory_bytes:
+            return None
+        lock = threading.RLock()
+        with self._lock:
+            if key in self._entries:
+                self._memory_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (explainer, size, lock)
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._memory_bytes -= evicted_size
+        return lock
@@ -1,11 +1,25 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
 import numpy as np
 import pandas as pd
+from joblib import Parallel, delayed
 from scipy import stats
+from scipy.spatial import cKDTree
 from scipy.stats import norm
-from sklearn.metrics import mean_squared_error
+from sklearn.base import is_classifier
+from sklearn.metrics import accuracy_score, mean_squared_error, r2_score
 
+from explainable_ai.neighbor_index import NeighborIndex
+from explainable_ai.registry import register
 from explainable_ai.understand_ai import Understanding
 
+# metrics computed from the predictions of the permuted datasource, larger is better
+PERMUTATION_SCORERS = {'accuracy': accuracy_score,
+                       'r2': r2_score,
+                       'neg_mean_squared_error': lambda y, y_pred: -mean_squared_error(y, y_pred)}
+
 
 class Interpretation(Understanding):
 
@@ -49,6 +63,36 @@ class Interpretation(Understanding):
         else:
             raise ValueError(f'{self.__class__.__name__} class does not find feature importance.')
 
+    def _iter_chunks(self, chunksize=None, data_path=None):
+        """
+        Yield (features, target) pairs of pandas objects covering the datasource. The rows are read
+        chunksize at a time from the csv at data_path, or sliced from the data source, which is
+        yielded whole if chunksize is None.
+        """
+        if data_path is not None:
+            chunks = pd.read_csv(data_path, chunksize=chunksize or 100_000, index_col=False)
+        elif self.data_source is not None:
+            step = chunksize or max(len(self.data_source), 1)
+            chunks = (self.data_source.iloc[i:i + step] for i in range(0, len(self.data_source), step))
+        else:
+            raise ValueError(f'{self.__class__.__name__} class must have a data source or a data path.')
+
+        for chunk in chunks:
+            if self.target_name:
+                y = chunk[self.target_name]
+            else:
+                y = chunk.iloc[:, -1]
+            yield chunk[self.feature_names[:-1]], y
+
+    def _predict_function(self, class_index=-1):
+        """
+        Predictions explained by the global effect methods: probability of the class_index class for
+        classifiers and the prediction otherwise.
+        """
+        if hasattr(self.model_to_understand, 'predict_proba'):
+            return lambda x: self.model_to_understand.predict_proba(x)[:, class_index]
+        return self.model_to_understand.predict
+
     def _uai_feature_importance(self, *args, **kwargs):
         n_feature = kwargs.get('n_feature')
         if n_feature:
@@ -60,6 +104,7 @@ class Interpretation(Understanding):
             return self.feature_importance, self.feature_names
 
 
+@register('tree')
 class TreeInterpretation(Interpretation):
 
     def __init__(self,
@@ -83,6 +128,7 @@ class TreeInterpretation(Interpretation):
                 'model': self.model_to_understand}
 
 
+@register('ensemble')
 class EnsembleInterpretation(Interpretation):
 
     def __init__(self,
@@ -112,6 +158,7 @@ class EnsembleInterpretation(Interpretation):
             return self.feature_importance, std, self.feature_names
 
 
+@register('linear')
 class LinearRegressionInterpretation(Interpretation):
 
     def __init__(self,
@@ -130,27 +177,39 @@ class LinearRegressionInterpretation(Interpretation):
                          feature_importance)
 
     def _uai_p_value(self, *args, **kwargs):
-        if self.data_source is not None:
-            X = self.data_source[self.feature_names[:-1]].values
-            if self.target_name:
-                y = self.data_source[self.target_name].values
-            else:
-                y = self.data_source.iloc[:, -1:].values.reshape(1, -1)[0]
-        else:
+        """
+        Coefficients' standard errors, t-values and p-values.
+
+        With chunksize or data_path the datasource is streamed and only X^T X and the residual sum
+        of squares are accumulated, so memory is bounded by the chunk and p^2 instead of n*p.
+
+        :param chunksize: Number of rows of each chunk.
+        :param data_path: A csv datasource read in chunks instead of the data source.
+        """
+        chunksize = kwargs.get('chunksize')
+        data_path = kwargs.get('data_path')
+        if self.data_source is None and data_path is None:
             raise ValueError(f'{self.__class__.__name__} class must have a data source in order to calculate p-value.')
 
         if self.model_to_understand:
             coef = np.append(self.model_to_understand.intercept_, self.model_to_understand.coef_)
-            X = np.append(np.ones((len(X), 1)), X, axis=1)
         else:
             raise ValueError(f'{self.__class__.__name__} class must have a model')
 
-        predictions = self.model_to_understand.predict(self.data_source[self.feature_names[:-1]])
-        mse = mean_squared_error(y, predictions)
-        var_b = mse*(np.linalg.pinv(np.dot(X.T, X)).diagonal())
+        n_rows, sse = 0, 0.
+        xtx = np.zeros((len(coef), len(coef)))
+        for x, y in self._iter_chunks(chunksize, data_path):
+            predictions = self.model_to_understand.predict(x)
+            X = np.append(np.ones((len(x), 1)), x.values, axis=1)
+            xtx += np.dot(X.T, X)
+            sse += float(np.sum((y.values - predictions) ** 2))
+            n_rows += len(x)
+
+        mse = sse / n_rows
+        var_b = mse*(np.linalg.pinv(xtx).diagonal())
         sd_b = np.sqrt(var_b)
         ts_b = coef/sd_b
-        p_values = [2 * (1 - stats.t.cdf(np.abs(i), (len(X) - len(X[0])))) for i in ts_b]
+        p_values = [2 * (1 - stats.t.cdf(np.abs(i), (n_rows - len(coef)))) for i in ts_b]
 
         return pd.DataFrame({
             "Coefficients": np.round(coef, 4),
@@ -160,6 +219,7 @@ class LinearRegressionInterpretation(Interpretation):
         })
 
 
+@register('logit')
 class LogisticRegressionInterpretation(Interpretation):
 
     def __init__(self,
@@ -187,15 +247,43 @@ class LogisticRegressionInterpretation(Interpretation):
         else:
             return self.feature_importance[0], self.feature_names
 
-    def statistic_logit(self):
-        coef = np.append(self.model_to_understand.intercept_, self.model_to_understand.coef_)
-        x = self.data_source[self.feature_names].values
+    def _fisher_information(self, x):
         X = np.column_stack((np.ones(x.shape[0]), x))
-
-        n, p = X.shape
         denom = 2 * (1 + np.cosh(self.model_to_understand.decision_function(x)))
-        denom = np.tile(denom, (p, 1)).T
-        fim = (X / denom).T @ X
+        return (X / denom[:, np.newaxis]).T @ X
+
+    def statistic_logit(self, chunksize=None, n_jobs=None, data_path=None):
+        """
+        Wald statistics of the coefficients from the Fisher information of the datasource.
+
+        With chunksize or data_path the rows are streamed and the Fisher information is accumulated
+        chunk by chunk into a p x p matrix, n_jobs chunks at a time in parallel threads.
+
+        :param chunksize: Number of rows of each chunk.
+        :param n_jobs: Number of chunks processed in parallel.
+        :param data_path: A csv datasource read in chunks instead of the data source.
+        """
+        coef = np.append(self.model_to_understand.intercept_, self.model_to_understand.coef_)
+        if data_path is not None:
+            chunks = pd.read_csv(data_path, chunksize=chunksize or 100_000, usecols=self.feature_names)
+        else:
+            step = chunksize or max(len(self.data_source), 1)
+            chunks = (self.data_source.iloc[i:i + step] for i in range(0, len(self.data_source), step))
+        chunks = (chunk[self.feature_names].values for chunk in chunks)
+
+        fim = np.zeros((len(coef), len(coef)))
+        if n_jobs is None or n_jobs == 1:
+            for x in chunks:
+                fim += self._fisher_information(x)
+        else:
+            # numpy releases the GIL in the products, at most n_jobs chunks are held in memory
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                while True:
+                    window = list(islice(chunks, n_jobs))
+                    if not window:
+                        break
+                    for chunk_fim in executor.map(self._fisher_information, window):
+                        fim += chunk_fim
         crao = np.linalg.pinv(fim)
         se = np.sqrt(np.diag(crao))
         z_scores = coef / se
@@ -226,6 +314,7 @@ class LogisticRegressionInterpretation(Interpretation):
         return stats
 
 
+@register('knn')
 class KNNInterpretation(Interpretation):
     def __init__(self,
                  arguments_used,
@@ -233,7 +322,15 @@ class KNNInterpretation(Interpretation):
                  data_source=None,
                  feature_names=None,
                  target_name=None,
-                 feature_importance=False):
+                 feature_importance=False,
+                 index_path=None,
+                 index_algorithm='auto'):
+        """
+
+        :param index_path: Where the NeighborIndex of the data source is stored, usually
+        NeighborIndex.path_for(data uri, understanding id). If None the index is kept in memory only.
+        :param index_algorithm: One of NEIGHBOR_INDEX_ALGORITHMS.
+        """
 
         super().__init__(arguments_used,
                          model_to_understand,
@@ -243,15 +340,34 @@ class KNNInterpretation(Interpretation):
                          feature_importance)
 
         self.target = self.data_source.iloc[:, -1:].values.reshape(1, -1)[0]
+        self.index_path = index_path
+        self.index_algorithm = index_algorithm
+        self._neighbor_index = None
+
+    @property
+    def neighbor_index(self):
+        if self._neighbor_index is None:
+            self._neighbor_index = NeighborIndex.load_or_build(
+                self.index_path,
+                self.data_source[self.feature_names[:-1]].values,
+                algorithm=self.index_algorithm,
+                metric=getattr(self.model_to_understand, 'effective_metric_', 'euclidean'),
+                metric_params=getattr(self.model_to_understand, 'effective_metric_params_', None))
+        return self._neighbor_index
+
+    def _use_index_algorithm(self, index_algorithm):
+        if index_algorithm is not None and index_algorithm != self.index_algorithm:
+            self.index_algorithm = index_algorithm
+            self._neighbor_index = None
 
     def _uai_feature_importance(self, *args, **kwargs):
         raise NotImplementedError("There isn't feature importance in KNN")
 
-    def _distance_representation(self, instance):
-        d, idx = self.model_to_understand.kneighbors(X=instance.reshape(1, -1), n_neighbors=20)
+    def _distance_representation(self, d, idx, prediction):
+        n_neighbors = d.shape[1]
         v = [v / np.max(d) * 5 for v in d[0][1:]]
         radius = np.array(v, dtype=float)
-        angle = np.linspace(0.1, np.pi, 19)
+        angle = np.linspace(0.1, np.pi, n_neighbors - 1)
         color = self.target[idx]
         aux = np.argsort(color[0][1:])
         c = color[0][1:]
@@ -262,28 +378,437 @@ class KNNInterpretation(Interpretation):
 
         x_c.insert(0, 0)
         y_c.insert(0, 0)
-        c = np.insert(c, 0, self.model_to_understand.predict(instance.reshape(1, -1)))
+        c = np.insert(c, 0, prediction)
 
         return x_c, y_c, c, np.argsort(aux)
 
     def _uai_find_neighborhood(self, *args, **kwargs):
         instance = kwargs.get('instance')
+        n_neighbors = kwargs.get('n_neighbors') or 20
+        self._use_index_algorithm(kwargs.get('index_algorithm'))
         if instance is not None:
-            return self._distance_representation(instance)
+            instance = np.asarray(instance, dtype=float).reshape(1, -1)
+            d, idx = self.neighbor_index.query(instance, n_neighbors=n_neighbors)
+            return self._distance_representation(d, idx, self.model_to_understand.predict(instance))
         else:
             raise ValueError(f'{self.__class__.__name__} doesnt '
                              f'handle with {type(instance)} as instance')
 
+    def _uai_find_neighborhoods(self, *args, **kwargs):
+        """
+        Neighbourhoods of a batch of instances answered by a single index query.
 
+        :return: A dictionary of arrays with shape (n_instances, n_neighbors): neighbour distances,
+        indices in the data source and targets, plus the model predictions of the instances.
+        """
+        instances = kwargs.get('instances')
+        n_neighbors = kwargs.get('n_neighbors') or 20
+        self._use_index_algorithm(kwargs.get('index_algorithm'))
+        if instances is None:
+            raise ValueError(f'{self._uai_find_neighborhoods.__name__} method '
+                             f'in {self.__class__.__name__} class missing argument')
 
+        instances = np.atleast_2d(np.asarray(instances, dtype=float))
+        distances, indices = self.neighbor_index.query(instances, n_neighbors=n_neighbors)
+        return {'distances': distances,
+                'indices': indices,
+                'targets': self.target[indices],
+                'predictions': self.model_to_understand.predict(instances)}
 
 
+class PermutationInterpretation(Interpretation):
 
+    """
+    Model agnostic feature importance: the decrease of the model score when the values of a feature
+    are shuffled. Features are evaluated in parallel, each worker reading the same read-only
+    memory mapped copy of the datasource and shuffling only the column it evaluates.
+    """
 
+    def __init__(self,
+                 arguments_used,
+                 model_to_understand=None,
+                 data_source=None,
+                 feature_names=None,
+                 target_name=None,
+                 feature_importance=False):
 
+        super().__init__(arguments_used,
+                         model_to_understand,
+                         data_source,
+                         feature_names,
+                         target_name,
+                         feature_importance)
 
+    def _data(self, max_rows=None, random_state=None):
+        if self.data_source is None:
+            raise ValueError(f'{self.__class__.__name__} class must have a data source '
+                             f'in order to calculate permutation importance.')
+        data = self.data_source
+        if max_rows is not None and len(data) > max_rows:
+            data = data.sample(n=max_rows, random_state=random_state)
+
+        X = np.ascontiguousarray(data[self.feature_names[:-1]].values)
+        if self.target_name:
+            y = data[self.target_name].values
+        else:
+            y = data.iloc[:, -1:].values.reshape(1, -1)[0]
+        return X, y
+
+    def _uai_permutation_importance(self, *args, **kwargs):
+        """
+        :param n_repeats: Number of shuffles of each feature.
+        :param n_feature: Number of most important features returned.
+        :param max_rows: Evaluate on a uniform subsample of max_rows rows of the datasource.
+        :param scoring: One of PERMUTATION_SCORERS, by default accuracy for classifiers and r2 otherwise.
+        :param n_jobs: Number of parallel workers (joblib convention, -1 uses all cores).
+        :param chunk_rows: Number of rows of each predict call.
+        :param confidence: Level of the confidence intervals.
+        :param random_state: Seed of the row subsample and of the shuffles.
+        :return: importances, standard deviations, confidence intervals and feature names.
+        """
+        n_repeats = kwargs.get('n_repeats') or 5
+        n_feature = kwargs.get('n_feature')
+        scoring = kwargs.get('scoring') or ('accuracy' if is_classifier(self.model_to_understand) else 'r2')
+        n_jobs = kwargs.get('n_jobs', -1)
+        chunk_rows = kwargs.get('chunk_rows') or 100_000
+        confidence = kwargs.get('confidence') or 0.95
+        random_state = kwargs.get('random_state')
+
+        if scoring not in PERMUTATION_SCORERS:
+            raise ValueError(f'{self.__class__.__name__} class doesnt know the scoring {scoring}')
+        scorer = PERMUTATION_SCORERS[scoring]
+
+        X, y = self._data(kwargs.get('max_rows'), random_state)
+        baseline = scorer(y, _chunked_predict(self.model_to_understand, X, chunk_rows))
+
+        seeds = np.random.SeedSequence(random_state).spawn(X.shape[1])
+        # arrays larger than max_nbytes are dumped once and memory mapped read-only by every worker
+        scores = Parallel(n_jobs=n_jobs, max_nbytes='1M', mmap_mode='r')(
+            delayed(_permuted_scores)(self.model_to_understand, X, y, j, n_repeats, scorer, chunk_rows, seed)
+            for j, seed in enumerate(seeds))
+
+        drops = baseline - np.asarray(scores)
+        importances = drops.mean(axis=1)
+        std = drops.std(axis=1, ddof=1) if n_repeats > 1 else np.zeros(len(importances))
+        margin = stats.t.ppf((1 + confidence) / 2, max(n_repeats - 1, 1)) * std / np.sqrt(n_repeats)
+        ci = np.column_stack((importances - margin, importances + margin))
+        names = self.feature_names[:-1]
+
+        if n_feature:
+            sorted_idx = np.argsort(importances)[::-1][:n_feature]
+            return importances[sorted_idx], std[sorted_idx], ci[sorted_idx], [names[i] for i in sorted_idx]
+        return importances, std, ci, names
+
+
+@register('ale')
+class ALEInterpretation(Interpretation):
+
+    """
+    Accumulated local effects of the features, first order for each feature and optionally second
+    order for a pair of features.
+
+    Bin edges are quantiles of the datasource, taken from its DataProfile when one is given. Rows are
+    streamed in chunks and, inside a chunk, the perturbations of every feature at the edges of their
+    bins are stacked into predict calls of at most max_batch_rows rows. Only per bin sums and counts
+    are accumulated, so memory does not grow with the datasource.
+    """
+
+    def __init__(self,
+                 arguments_used,
+                 model_to_understand=None,
+                 data_source=None,
+                 feature_names=None,
+                 target_name=None,
+                 feature_importance=False,
+                 profile=None):
+        """
+
+        :param profile: A DataProfile of the data source, used for the bin edges.
+        """
+
+        super().__init__(arguments_used,
+                         model_to_understand,
+                         data_source,
+                         feature_names,
+                         target_name,
+                         feature_importance)
+        self.profile = profile
 
+    def _edges(self, feature, n_bins):
+        levels = np.linspace(0, 1, n_bins + 1)
+        if self.profile is not None:
+            quantiles = np.asarray(self.profile.quantiles[feature])
+            return np.unique(quantiles[np.rint(levels * (len(quantiles) - 1)).astype(int)])
+        if self.data_source is not None:
+            return np.unique(np.quantile(self.data_source[feature].dropna().values, levels))
+        raise ValueError(f'{self.__class__.__name__} class must have a profile or a data source '
+                         f'in order to calculate the bins of {feature}.')
 
+    def _uai_ale(self, *args, **kwargs):
+        """
+        :param which_feature: The feature analyzed, all features if None.
+        :param second_order: A pair of feature names whose second order effect is also computed.
+        :param n_bins: Number of quantile bins of each feature.
+        :param class_index: Output explained for classifiers, the last class by default.
+        :param chunksize: Number of rows of each chunk of the datasource.
+        :param data_path: A csv datasource read in chunks instead of the data source.
+        :param max_batch_rows: Maximum number of rows of each predict call.
+        :return: A dictionary with, for each feature, the bin edges, the centered ALE at the edges and
+        the number of rows of each bin, plus the second order effect if it was requested.
+        """
+        which_feature = kwargs.get('which_feature')
+        second_order = kwargs.get('second_order')
+        n_bins = kwargs.get('n_bins') or 20
+        max_batch_rows = kwargs.get('max_batch_rows') or 1_000_000
+        predict = self._predict_function(kwargs.get('class_index', -1))
+
+        x_names = list(self.feature_names[:-1])
+        features = [which_feature] if which_feature else x_names
+        edges = {feature: self._edges(feature, n_bins) for feature in features}
+        features = [feature for feature in features if len(edges[feature]) > 1]
+        sums = {feature: np.zeros(len(edges[feature]) - 1) for feature in features}
+        counts = {feature: np.zeros(len(edges[feature]) - 1) for feature in features}
+
+        if second_order:
+            pair = [x_names.index(feature) for feature in second_order]
+            pair_edges = [self._edges(feature, n_bins) for feature in second_order]
+            pair_shape = (len(pair_edges[0]) - 1, len(pair_edges[1]) - 1)
+            pair_sums, pair_counts = np.zeros(pair_shape), np.zeros(pair_shape)
+
+        columns = [x_names.index(feature) for feature in features]
+        # rows per predict call, each row is perturbed twice per feature and four times for the pair
+        step = max(1, max_batch_rows // max(2 * len(columns), 1))
+        pair_step = max(1, max_batch_rows // 4)
+        for x, _ in self._iter_chunks(kwargs.get('chunksize'), kwargs.get('data_path')):
+            x = x.values.astype(float)
+            for i in range(0, len(x), step) if columns else ():
+                _accumulate_first_order(predict, x[i:i + step], x_names, columns,
+                                        [edges[f] for f in features],
+                                        [sums[f] for f in features],
+                                        [counts[f] for f in features])
+            for i in range(0, len(x), pair_step) if second_order else ():
+                _accumulate_second_order(predict, x[i:i + pair_step], x_names, pair,
+                                         pair_edges, pair_sums, pair_counts)
+
+        result = {'feature_names': features,
+                  'edges': {feature: edges[feature] for feature in features},
+                  'ale': {feature: _first_order_ale(sums[feature], counts[feature]) for feature in features},
+                  'counts': {feature: counts[feature] for feature in features}}
+        if second_order:
+            result['second_order'] = {'feature_names': list(second_order),
+                                      'edges': pair_edges,
+                                      'ale': _second_order_ale(pair_sums, pair_counts),
+                                      'counts': pair_counts}
+        return result
+
+
+class PartialDependenceInterpretation(Interpretation):
+
+    """
+    Partial dependence (PDP) and individual conditional expectation (ICE) of one or two features.
+
+    The rows are replicated over the grid in blocks of at most max_batch_rows predictions, so memory
+    is bounded by the block and never by grid size x number of rows. Only the grid sums are kept for
+    the PDP, the ICE curves are appended to a Parquet file as each block is predicted.
+    """
 
+    def __init__(self,
+                 arguments_used,
+                 model_to_understand=None,
+                 data_source=None,
+                 feature_names=None,
+                 target_name=None,
+                 feature_importance=False,
+                 profile=None):
+        """
 
+        :param profile: A DataProfile of the data source, used for the grids.
+        """
+
+        super().__init__(arguments_used,
+                         model_to_understand,
+                         data_source,
+                         feature_names,
+                         target_name,
+                         feature_importance)
+        self.profile = profile
+
+    def _grid(self, feature, grid_size, percentiles):
+        levels = np.linspace(percentiles[0], percentiles[1], grid_size)
+        if self.profile is not None:
+            quantiles = np.asarray(self.profile.quantiles[feature])
+            return np.unique(quantiles[np.rint(levels * (len(quantiles) - 1)).astype(int)])
+        if self.data_source is not None:
+            return np.unique(np.quantile(self.data_source[feature].dropna().values, levels))
+        raise ValueError(f'{self.__class__.__name__} class must have a profile or a data source '
+                         f'in order to calculate the grid of {feature}.')
 
+    def _uai_partial_dependence(self, *args, **kwargs):
+        """
+        :param features: One or two feature names.
+        :param grid_size: Number of grid points of each feature.
+        :param percentiles: Lower and upper quantile levels of the grid.
+        :param max_rows: Use a uniform sample of max_rows rows of the data source.
+        :param class_index: Output explained for classifiers, the last class by default.
+        :param chunksize: Number of rows of each chunk of the datasource.
+        :param data_path: A csv datasource read in chunks instead of the data source.
+        :param max_batch_rows: Maximum number of rows of each predict call.
+        :param ice_path: Parquet file receiving the ICE curves, one row per datasource row and one
+        column per grid point. Only the PDP is computed if None.
+        :param random_state: Seed of the row sample.
+        :return: A dictionary with the features, their grids, the partial dependence with shape
+        (grid size,) or (grid size a, grid size b), the number of rows used and the ICE file.
+        """
+        features = kwargs.get('features')
+        if not features or len(features) > 2:
+            raise ValueError(f'{self.__class__.__name__} class computes the partial dependence '
+                             f'of one or two features, got {features}')
+        grid_size = kwargs.get('grid_size') or 20
+        percentiles = kwargs.get('percentiles') or (0.05, 0.95)
+        max_batch_rows = kwargs.get('max_batch_rows') or 1_000_000
+        ice_path = kwargs.get('ice_path')
+        predict = self._predict_function(kwargs.get('class_index', -1))
+
+        x_names = list(self.feature_names[:-1])
+        columns = [x_names.index(feature) for feature in features]
+        grids = [self._grid(feature, grid_size, percentiles) for feature in features]
+        # one row per grid point with the value of each feature
+        points = np.array(np.meshgrid(*grids, indexing='ij')).reshape(len(features), -1).T
+
+        chunks = self._iter_chunks(kwargs.get('chunksize'), kwargs.get('data_path'))
+        max_rows = kwargs.get('max_rows')
+        if max_rows is not None and kwargs.get('data_path') is None and len(self.data_source) > max_rows:
+            sample = self.data_source.sample(n=max_rows, random_state=kwargs.get('random_state'))
+            chunks = [(sample[x_names], None)]
+
+        writer = None
+        if ice_path is not None:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            schema = pa.schema([('row', pa.int64())] + [(f'ice_{i}', pa.float64()) for i in range(len(points))],
+                               metadata={'features': json.dumps(list(features)),
+                                         'grid': json.dumps(points.tolist())})
+            writer = pq.ParquetWriter(ice_path, schema)
+
+        sums = np.zeros(len(points))
+        n_rows = 0
+        step = max(1, max_batch_rows // len(points))
+        try:
+            for x, _ in chunks:
+                x = x.values.astype(float)
+                for i in range(0, len(x), step):
+                    block = x[i:i + step]
+                    stacked = np.repeat(block[np.newaxis], len(points), axis=0)
+                    for k, column in enumerate(columns):
+                        stacked[:, :, column] = points[:, k, np.newaxis]
+                    ice = _stacked_predict(predict, stacked, x_names)
+                    sums += ice.sum(axis=1)
+
+                    if writer is not None:
+                        writer.write_table(pa.Table.from_arrays(
+                            [pa.array(np.arange(n_rows, n_rows + len(block)))] + [pa.array(curve) for curve in ice],
+                            schema=schema))
+                    n_rows += len(block)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        return {'feature_names': list(features),
+                'grid': grids,
+                'average': (sums / max(n_rows, 1)).reshape([len(grid) for grid in grids]),
+                'n_rows': n_rows,
+                'ice_path': ice_path}
+
+
+def _bin_index(values, edges):
+    return np.clip(np.searchsorted(edges, values, side='left') - 1, 0, len(edges) - 2)
+
+
+def _stacked_predict(predict, stacked, x_names):
+    n_copies, n_rows, n_columns = stacked.shape
+    predictions = predict(pd.DataFrame(stacked.reshape(n_copies * n_rows, n_columns), columns=x_names))
+    return np.asarray(predictions, dtype=float).reshape(n_copies, n_rows)
+
+
+def _accumulate_first_order(predict, x, x_names, columns, edges, sums, counts):
+    # copies 2i and 2i+1 move the feature of columns[i] to the lower and upper edges of its bin
+    stacked = np.repeat(x[np.newaxis], 2 * len(columns), axis=0)
+    bins = []
+    for i, (column, feature_edges) in enumerate(zip(columns, edges)):
+        k = _bin_index(x[:, column], feature_edges)
+        stacked[2 * i, :, column] = feature_edges[k]
+        stacked[2 * i + 1, :, column] = feature_edges[k + 1]
+        bins.append(k)
+
+    predictions = _stacked_predict(predict, stacked, x_names)
+    for i, k in enumerate(bins):
+        sums[i] += np.bincount(k, weights=predictions[2 * i + 1] - predictions[2 * i], minlength=len(sums[i]))
+        counts[i] += np.bincount(k, minlength=len(counts[i]))
+
+
+def _accumulate_second_order(predict, x, x_names, pair, edges, sums, counts):
+    (column_a, column_b), (edges_a, edges_b) = pair, edges
+    k_a, k_b = _bin_index(x[:, column_a], edges_a), _bin_index(x[:, column_b], edges_b)
+
+    # corners (low, low), (high, low), (low, high), (high, high) of the cell of each row
+    stacked = np.repeat(x[np.newaxis], 4, axis=0)
+    for corner in range(4):
+        stacked[corner, :, column_a] = edges_a[k_a + corner % 2]
+        stacked[corner, :, column_b] = edges_b[k_b + corner // 2]
+    predictions = _stacked_predict(predict, stacked, x_names)
+
+    cells = k_a * sums.shape[1] + k_b
+    differences = predictions[3] - predictions[2] - predictions[1] + predictions[0]
+    sums += np.bincount(cells, weights=differences, minlength=sums.size).reshape(sums.shape)
+    counts += np.bincount(cells, minlength=counts.size).reshape(counts.shape)
+
+
+def _first_order_ale(sums, counts):
+    effects = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+    ale = np.concatenate(([0.], np.cumsum(effects)))
+    # centered so that the mean effect over the datasource is zero
+    return ale - np.sum(counts * (ale[:-1] + ale[1:]) / 2) / max(counts.sum(), 1)
+
+
+def _second_order_ale(sums, counts):
+    effects = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+    if np.any(counts > 0) and np.any(counts == 0):
+        # empty cells take the effect of the nearest non empty cell
+        filled, empty = np.argwhere(counts > 0), np.argwhere(counts == 0)
+        nearest = filled[cKDTree(filled).query(empty)[1]]
+        effects[empty[:, 0], empty[:, 1]] = effects[nearest[:, 0], nearest[:, 1]]
+
+    ale = np.zeros((sums.shape[0] + 1, sums.shape[1] + 1))
+    ale[1:, 1:] = np.cumsum(np.cumsum(effects, axis=0), axis=1)
+
+    # remove the first order effects left in the accumulated differences
+    total = np.maximum(counts.sum(axis=1), 1)
+    delta = ale[1:, :] - ale[:-1, :]
+    main_a = np.concatenate(([0.], np.cumsum(np.sum(counts * (delta[:, :-1] + delta[:, 1:]) / 2, axis=1) / total)))
+    total = np.maximum(counts.sum(axis=0), 1)
+    delta = ale[:, 1:] - ale[:, :-1]
+    main_b = np.concatenate(([0.], np.cumsum(np.sum(counts * (delta[:-1, :] + delta[1:, :]) / 2, axis=0) / total)))
+    ale -= main_a[:, np.newaxis] + main_b[np.newaxis, :]
+
+    centers = (ale[:-1, :-1] + ale[1:, :-1] + ale[:-1, 1:] + ale[1:, 1:]) / 4
+    return ale - np.sum(counts * centers) / max(counts.sum(), 1)
+
+
+def _chunked_predict(model, X, chunk_rows):
+    return np.concatenate([model.predict(X[i:i + chunk_rows]) for i in range(0, len(X), chunk_rows)])
+
+
+def _permuted_scores(model, X, y, column, n_repeats, scorer, chunk_rows, seed):
+    rng = np.random.default_rng(seed)
+    scores = []
+    for _ in range(n_repeats):
+        permuted = rng.permutation(X[:, column])
+        predictions = []
+        for i in range(0, len(X), chunk_rows):
+            # X may be a read-only memmap, only the chunk being predicted is copied
+            chunk = np.array(X[i:i + chunk_rows])
+            chunk[:, column] = permuted[i:i + chunk_rows]
+            predictions.append(model.predict(chunk))
+        scores.append(scorer(y, np.concatenate(predictions)))
+    return scores
@@ -0,0 +1,227 @@
+import numpy as np
+
+from .noise_set import standard_normal
+
+
+class BatchLimeTabular:
+
+    """
+    LIME for tabular data vectorized over a batch of instances.
+
+    Perturbations of every instance are generated together, the model is called once over the
+    stacked samples (or once per max_rows block) and the weighted ridge surrogates of all instances
+    are solved at the same time from their normal equations. Results are plain numpy arrays.
+    """
+
+    def __init__(self, means, stds, feature_names=None, mode='classification', kernel_width=None,
+                 discretize=False, bins=None, sample_around_instance=True, alpha=1.0, random_state=None,
+                 sampler='random'):
+        """
+
+        :param means: Training mean of each feature.
+        :param stds: Training standard deviation of each feature.
+        :param feature_names: An iterable containing feature names.
+        :param mode: 'classification' or 'regression'.
+        :param kernel_width: Width of the exponential kernel, by default 0.75 * sqrt(n_features) as in LIME.
+        :param discretize: If True the surrogate is fitted over indicators of "same bin as the instance".
+        :param bins: Inner bin borders of each feature, required when discretize is True.
+        :param sample_around_instance: Sample around the instance instead of around the training mean.
+        :param alpha: Ridge regularization of the surrogates.
+        :param random_state: Seed of the numpy Generator used to sample perturbations.
+        :param sampler: 'random', or 'sobol' and 'lhs' for low discrepancy perturbations (see NoiseSet).
+        """
+        self.means = np.asarray(means, dtype=float)
+        self.stds = np.where(np.asarray(stds, dtype=float) == 0, 1.0, np.asarray(stds, dtype=float))
+        self.feature_names = list(feature_names) if feature_names is not None else \
+            [str(i) for i in range(len(self.means))]
+        self.mode = mode
+        self.kernel_width = kernel_width if kernel_width is not None else 0.75 * np.sqrt(len(self.means))
+        self.discretize = discretize
+        self.bins = [np.asarray(b, dtype=float) for b in bins] if bins is not None else None
+        self.sample_around_instance = sample_around_instance
+        self.alpha = alpha
+        self.rng = np.random.default_rng(random_state)
+        self.sampler = sampler
+
+        if self.discretize and self.bins is None:
+            raise ValueError(f'{self.__class__.__name__} needs bins to discretize')
+
+    def sample(self, instances, num_samples, include_instance=True):
+        """
+        Return the perturbations with shape (n_instances, num_samples, n_features) and their kernel weights.
+        If include_instance is True the first sample of each instance is the instance itself.
+        """
+        z = standard_normal(self.rng, (len(instances), num_samples, len(self.means)), self.sampler)
+
+        center = instances[:, np.newaxis, :] if self.sample_around_instance else self.means
+        samples = z * self.stds + center
+        if include_instance:
+            samples[:, 0, :] = instances
+
+        scaled = (samples - instances[:, np.newaxis, :]) / self.stds
+        distances = np.sqrt(np.einsum('nsp,nsp->ns', scaled, scaled))
+        weights = np.sqrt(np.exp(-(distances ** 2) / self.kernel_width ** 2))
+        return samples, weights
+
+    def representation(self, samples, instances):
+        """
+        Interpretable representation fitted by the surrogate: scaled features or indicators of the
+        samples falling in the same bin as their instance.
+        """
+        if not self.discretize:
+            return (samples - self.means) / self.stds
+        instances = instances[:, np.newaxis, :]
+        return np.stack([np.searchsorted(self.bins[j], samples[..., j]) ==
+                         np.searchsorted(self.bins[j], instances[..., j])
+                         for j in range(samples.shape[-1])], axis=-1).astype(float)
+
+    def predict(self, predict_fn, samples, max_rows=None):
+        n, s, p = samples.shape
+        flat = samples.reshape(n * s, p)
+        if max_rows is None or len(flat) <= max_rows:
+            predictions = np.asarray(predict_fn(flat))
+        else:
+            predictions = np.concatenate([np.asarray(predict_fn(flat[i:i + max_rows]))
+                                          for i in range(0, len(flat), max_rows)])
+        return predictions.reshape((n, s) + predictions.shape[1:])
+
+    def select_labels(self, predictions, labels=None):
+        """
+        Reduce classification predictions to the explained label of each instance, by default the predicted one.
+        """
+        if predictions.ndim == 2:
+            return predictions, labels
+        if labels is None:
+            labels = np.argmax(predictions[:, 0, :], axis=1)
+        labels = np.broadcast_to(np.asarray(labels), (len(predictions),))
+        return np.take_along_axis(predictions, labels[:, np.newaxis, np.newaxis], axis=2)[..., 0], labels
+
+    @staticmethod
+    def normal_equations(representation, weights, targets):
+        """
+        Weighted sufficient statistics of the surrogates, which can be summed over sampling rounds.
+        """
+        design = np.concatenate([np.ones(representation.shape[:2] + (1,)), representation], axis=2)
+        return {'gram': np.einsum('nsi,ns,nsj->nij', design, weights, design),
+                'moment': np.einsum('nsi,ns,ns->ni', design, weights, targets),
+                'sw': weights.sum(axis=1),
+                'swy': np.einsum('ns,ns->n', weights, targets),
+                'swy2': np.einsum('ns,ns,ns->n', weights, targets, targets)}
+
+    def solve(self, stats):
+        """
+        Solve the ridge surrogates (intercept not penalized) and return intercepts, coefficients and weighted R2.
+        """
+        n_params = stats['gram'].shape[1]
+        penalty = self.alpha * np.eye(n_params)
+        penalty[0, 0] = 0
+        beta = np.linalg.solve(stats['gram'] + penalty, stats['moment'][..., np.newaxis])[..., 0]
+
+        ss_res = stats['swy2'] - 2 * np.einsum('ni,ni->n', beta, stats['moment']) + \
+            np.einsum('ni,nij,nj->n', beta, stats['gram'], beta)
+        ss_tot = stats['swy2'] - stats['swy'] ** 2 / stats['sw']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = np.where(ss_tot > 0, 1 - ss_res / ss_tot, 1.0)
+        return beta[:, 0], beta[:, 1:], scores
+
+    def explain(self, instances, predict_fn, num_samples=5000, labels=None, max_rows=None):
+        """
+        Explain a batch of instances.
+
+        :param instances: An array-like with shape (n_instances, n_features).
+        :param predict_fn: predict_proba for classification or predict for regression.
+        :param num_samples: Number of perturbations of each instance.
+        :param labels: Explained label of each instance in classification, by default the predicted one.
+        :param max_rows: Maximum number of rows of each predict_fn call, all samples at once if None.
+        :return: A dictionary of arrays: intercepts, coefficients (n_instances, n_features), scores,
+        local predictions, model predictions of the instances, labels and feature names.
+        """
+        instances = np.atleast_2d(np.asarray(instances, dtype=float))
+        samples, weights = self.sample(instances, num_samples)
+        targets, labels = self.select_labels(self.predict(predict_fn, samples, max_rows), labels)
+
+        stats = self.normal_equations(self.representation(samples, instances), weights, targets)
+        intercepts, coefficients, scores = self.solve(stats)
+
+        return self._result(instances, intercepts, coefficients, scores, targets[:, 0], labels,
+                            np.full(len(instances), num_samples))
+
+    def explain_adaptive(self, instances, predict_fn, initial_samples=500, max_samples=20000, growth=2,
+                         tolerance=0.01, convergence='fidelity', labels=None, max_rows=None):
+        """
+        Explain a batch of instances growing the perturbations of each instance in rounds until its
+        surrogate converges.
+
+        Each round draws (growth - 1) times the samples used so far for the instances still running,
+        scores their current surrogate on these new samples before adding them (held-out fidelity) and
+        refits it. An instance stops when its held-out weighted R2 changes by at most tolerance between
+        two rounds ('fidelity'), or when the ranking of its absolute coefficients is unchanged ('rank').
+        The normal equations of the rounds are summed, so no perturbation is kept between rounds.
+
+        :return: The dictionary of explain, num_samples holding the samples used by each instance.
+        """
+        if convergence not in ('fidelity', 'rank'):
+            raise ValueError(f'{self.__class__.__name__} class doesnt know the convergence {convergence}')
+        instances = np.atleast_2d(np.asarray(instances, dtype=float))
+
+        samples, weights = self.sample(instances, initial_samples)
+        targets, labels = self.select_labels(self.predict(predict_fn, samples, max_rows), labels)
+        predictions = targets[:, 0]
+        stats = self.normal_equations(self.representation(samples, instances), weights, targets)
+        intercepts, coefficients, scores = self.solve(stats)
+        del samples, weights, targets
+
+        num_samples = np.full(len(instances), initial_samples)
+        ranks = np.argsort(-np.abs(coefficients), axis=1)
+        fidelity = np.full(len(instances), np.nan)
+        active = np.arange(len(instances))
+
+        while len(active) and num_samples[active[0]] < max_samples:
+            n_new = min(max(int(num_samples[active[0]] * (growth - 1)), 1),
+                        max_samples - num_samples[active[0]])
+            samples, weights = self.sample(instances[active], n_new, include_instance=False)
+            representation = self.representation(samples, instances[active])
+            targets, _ = self.select_labels(self.predict(predict_fn, samples, max_rows), labels[active]
+                                            if labels is not None else None)
+
+            new_fidelity = _weighted_r2(targets, weights, intercepts[active][:, np.newaxis] + np.einsum(
+                'nsp,np->ns', representation, coefficients[active]))
+            round_stats = self.normal_equations(representation, weights, targets)
+            for key in stats:
+                stats[key][active] += round_stats[key]
+            del samples, weights, representation, targets, round_stats
+
+            round_solution = self.solve({key: value[active] for key, value in stats.items()})
+            intercepts[active], coefficients[active], scores[active] = round_solution
+            num_samples[active] += n_new
+
+            new_ranks = np.argsort(-np.abs(coefficients[active]), axis=1)
+            if convergence == 'fidelity':
+                converged = np.abs(new_fidelity - fidelity[active]) <= tolerance
+            else:
+                converged = np.all(new_ranks == ranks[active], axis=1)
+            ranks[active], fidelity[active] = new_ranks, new_fidelity
+            active = active[~converged]
+
+        return self._result(instances, intercepts, coefficients, scores, predictions, labels, num_samples)
+
+    def _result(self, instances, intercepts, coefficients, scores, predictions, labels, num_samples):
+        # the representation of the instance itself
+        representation = self.representation(instances[:, np.newaxis, :], instances)[:, 0, :]
+        local_predictions = intercepts + np.einsum('np,np->n', coefficients, representation)
+        return {'feature_names': self.feature_names,
+                'intercepts': intercepts,
+                'coefficients': coefficients,
+                'scores': scores,
+                'local_predictions': local_predictions,
+                'predictions': predictions,
+                'labels': labels,
+                'num_samples': num_samples}
+
+
+def _weighted_r2(targets, weights, predictions):
+    mean = np.einsum('ns,ns->n', weights, targets) / weights.sum(axis=1)
+    ss_res = np.einsum('ns,ns->n', weights, (targets - predictions) ** 2)
+    ss_tot = np.einsum('ns,ns->n', weights, (targets - mean[:, np.newaxis]) ** 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(ss_tot > 0, 1 - ss_res / ss_tot, 1.0)
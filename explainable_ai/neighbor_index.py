@@ -0,0 +1,105 @@
+import os
+
+import joblib
+import numpy as np
+from sklearn.neighbors import BallTree, KDTree
+
+NEIGHBOR_INDEX_ALGORITHMS = ('auto', 'kd_tree', 'ball_tree', 'approximate')
+
+
+class NeighborIndex:
+
+    """
+    Nearest neighbour index over the reference set of a KNN understanding.
+
+    The index is built once, stored next to the datasource and answers the neighbourhood queries
+    of a whole batch of instances in one call. Exact search uses a KD-tree or a ball tree, the
+    approximate search for high dimensional data uses pynndescent when it is installed.
+    """
+
+    file_suffix = '.knn.joblib'
+    # above this number of dimensions 'auto' prefers a ball tree to a KD-tree
+    kd_tree_max_dimensions = 15
+
+    def __init__(self, data, algorithm='auto', metric='euclidean', metric_params=None, leaf_size=40,
+                 random_state=None):
+        """
+
+        :param data: An array-like with shape (n_samples, n_features) with the reference set.
+        :param algorithm: One of NEIGHBOR_INDEX_ALGORITHMS.
+        :param metric: Distance metric, usually the effective_metric_ of the KNN model.
+        :param metric_params: Additional metric arguments, as the effective_metric_params_ of the KNN model.
+        :param leaf_size: Leaf size of the trees.
+        :param random_state: Seed of the approximate index.
+        """
+        if algorithm not in NEIGHBOR_INDEX_ALGORITHMS:
+            raise ValueError(f'{self.__class__.__name__} class doesnt know the algorithm {algorithm}')
+
+        data = np.ascontiguousarray(data, dtype=float)
+        if algorithm == 'auto':
+            algorithm = 'kd_tree' if data.shape[1] <= self.kd_tree_max_dimensions else 'ball_tree'
+        if algorithm == 'kd_tree' and metric not in KDTree.valid_metrics:
+            algorithm = 'ball_tree'
+
+        self.algorithm = algorithm
+        self.metric = metric
+        metric_params = metric_params or {}
+        self.n_samples, self.n_features = data.shape
+
+        if algorithm == 'approximate':
+            try:
+                from pynndescent import NNDescent
+            except ImportError:
+                raise ValueError(f"{self.__class__.__name__} class needs pynndescent for approximate search")
+            self.index = NNDescent(data, metric=metric, metric_kwds=metric_params, random_state=random_state)
+            self.index.prepare()
+        elif algorithm == 'kd_tree':
+            self.index = KDTree(data, leaf_size=leaf_size, metric=metric, **metric_params)
+        else:
+            self.index = BallTree(data, leaf_size=leaf_size, metric=metric, **metric_params)
+
+    @classmethod
+    def path_for(cls, uri, understanding_id):
+        return f'{uri}.{understanding_id}{cls.file_suffix}'
+
+    def query(self, instances, n_neighbors=20):
+        """
+        Return the distances and indices of the n_neighbors nearest neighbours of every instance,
+        both with shape (n_instances, n_neighbors), sorted by distance.
+        """
+        instances = np.atleast_2d(np.asarray(instances, dtype=float))
+        if instances.shape[1] != self.n_features:
+            raise ValueError(f'{self.__class__.__name__} class expects instances with '
+                             f'{self.n_features} features, got {instances.shape[1]}')
+        n_neighbors = min(n_neighbors, self.n_samples)
+
+        if self.algorithm == 'approximate':
+            indices, distances = self.index.query(instances, k=n_neighbors)
+            return distances, indices
+        return self.index.query(instances, k=n_neighbors)
+
+    def save(self, path):
+        tmp_path = f'{path}.tmp'
+        joblib.dump(self, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        return joblib.load(path)
+
+    @classmethod
+    def load_or_build(cls, path, data, **kwargs):
+        """
+        Load the index stored at path, or build it from data and store it there.
+        An index built over a reference set of another shape or with another algorithm is rebuilt.
+        """
+        data = np.asarray(data)
+        if path is not None and os.path.isfile(path):
+            index = cls.load(path)
+            if (index.n_samples, index.n_features) == data.shape and \
+                    kwargs.get('algorithm', 'auto') in ('auto', index.algorithm):
+                return index
+        index = cls(data, **kwargs)
+        if path is not None:
+            index.save(path)
+        return index
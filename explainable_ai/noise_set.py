@@ -1,13 +1,83 @@
 import numpy as np
 import pandas as pd
+from scipy.special import ndtri
+from scipy.stats import qmc
+
+SAMPLERS = ('random', 'sobol', 'lhs')
+
+# quasi-random points are kept away from 0 and 1 before the inverse normal CDF
+_UNIT_EPSILON = 1e-7
+
+
+def fill_unit_samples(rng, out, sampler):
+    """
+    Fill out, with shape (n_samples, n_dimensions), with points in [0, 1) drawn by sampler:
+    i.i.d. uniform ('random'), a scrambled Sobol sequence ('sobol') or a Latin hypercube ('lhs').
+    """
+    n_samples, n_dimensions = out.shape
+    if sampler == 'random':
+        rng.random(out=out, dtype=out.dtype)
+    elif sampler == 'sobol':
+        engine = qmc.Sobol(d=n_dimensions, scramble=True, seed=rng)
+        for start in range(0, n_samples, 65536):
+            out[start:start + 65536] = engine.random(min(65536, n_samples - start))
+    elif sampler == 'lhs':
+        # one random stratum order per dimension, one uniform point inside each stratum
+        for j in range(n_dimensions):
+            out[:, j] = (rng.permutation(n_samples) + rng.random(n_samples)) / n_samples
+    else:
+        raise ValueError(f'Sampler {sampler} does not exist, use one of {SAMPLERS}')
+    return out
+
+
+def fill_standard_normal(rng, out, sampler):
+    """
+    Fill out with standard normal samples, quasi-random samples being mapped by the inverse normal CDF.
+    """
+    if sampler == 'random':
+        return rng.standard_normal(out=out, dtype=out.dtype)
+    fill_unit_samples(rng, out, sampler)
+    np.clip(out, _UNIT_EPSILON, 1 - _UNIT_EPSILON, out=out)
+    return ndtri(out, out=out)
+
+
+def standard_normal(rng, shape, sampler='random', dtype=np.float64):
+    """
+    Standard normal samples with shape (..., n_samples, n_dimensions), each leading index getting its
+    own quasi-random sequence.
+    """
+    if sampler == 'random':
+        return rng.standard_normal(shape, dtype=dtype)
+    out = np.empty(shape, dtype=dtype)
+    for block in out.reshape((-1,) + tuple(shape[-2:])):
+        fill_standard_normal(rng, block, sampler)
+    return out
+
+
+def uniform(rng, shape, sampler='random'):
+    if sampler == 'random':
+        return rng.random(shape)
+    out = np.empty(shape)
+    for block in out.reshape((-1,) + tuple(shape[-2:])):
+        fill_unit_samples(rng, block, sampler)
+    return out
 
 
 class NoiseSet:
 
-    def __init__(self, num_samples,  x_data=None, info_data=None):
+    def __init__(self, num_samples,  x_data=None, info_data=None, random_state=None, sampler='random'):
+        """
+
+        :param sampler: One of SAMPLERS. 'sobol' and 'lhs' draw low discrepancy points, mapped to the
+        normal or uniform noise by the inverse CDF, which cover the neighbourhood with fewer samples.
+        """
+        if sampler not in SAMPLERS:
+            raise ValueError(f"class {self.__class__.__name__} does not know the sampler {sampler}")
         self.num_samples = num_samples
         self.x_data = x_data
         self.info_data = info_data
+        self.rng = np.random.default_rng(random_state)
+        self.sampler = sampler
 
     @property
     def x_data(self):
@@ -15,7 +85,7 @@ class NoiseSet:
 
     @x_data.setter
     def x_data(self, x_data):
-        if isinstance(x_data, pd.DataFrame):
+        if x_data is None or isinstance(x_data, pd.DataFrame):
             self._x_data = x_data
         else:
             raise ValueError(f"class {self.__class__.__name__} just accept pandas DataFrame")
@@ -38,41 +108,133 @@ class NoiseSet:
         else:
             self._info_data = info_data
 
-    def normal_with_bias(self, instance, scale=None, approach_rate=0.15):
+    def _normal_scale(self, scale, approach_rate):
         if scale is not None:
-            noise_set = np.random.normal(instance,
-                                         scale=scale*approach_rate,
-                                         size=(self.num_samples, len(instance)))
+            return np.asarray(scale) * approach_rate
         elif self.info_data is not None:
-            noise_set = np.random.normal(instance,
-                                         scale=self.info_data['std']*approach_rate,
-                                         size=(self.num_samples, len(instance)))
+            return np.asarray(self.info_data['std']) * approach_rate
         else:
             raise ValueError(f"class {self.__class__.__name__} must have info_data "
                              f"different to None or pass scale parameter")
 
-        max_, min_ = self.info_data.get('max').values, self.info_data.get('min').values
+    def _clip_bounds(self):
+        if self.info_data is None:
+            return None, None
+        max_, min_ = self.info_data.get('max'), self.info_data.get('min')
+        if max_ is None or min_ is None:
+            return None, None
+        return np.asarray(min_), np.asarray(max_)
+
+    def _uniform_bounds(self, min_values, max_values):
+        if min_values is not None and max_values is not None:
+            return min_values, max_values
+        min_, max_ = self._clip_bounds()
+        if min_ is None:
+            raise ValueError(f"class {self.__class__.__name__} must have info_data "
+                             f"different to None or pass min and max values as  parameter")
+        return min_, max_
+
+    def normal_with_bias(self, instance, scale=None, approach_rate=0.15):
+        if self.sampler == 'random':
+            noise_set = self.rng.normal(instance,
+                                        scale=self._normal_scale(scale, approach_rate),
+                                        size=(self.num_samples, len(instance)))
+        else:
+            noise_set = standard_normal(self.rng, (self.num_samples, len(instance)), self.sampler)
+            noise_set *= self._normal_scale(scale, approach_rate)
+            noise_set += np.asarray(instance, dtype=float)
+
+        min_, max_ = self._clip_bounds()
         if max_ is not None and min_ is not None:
             noise_set = np.clip(noise_set, min_, max_)
 
         return noise_set
 
-    def uniform_distance(self, instance, min_values=None, max_values=None):
+    def normal_with_bias_batch(self, instances, scale=None, approach_rate=0.15):
+        """
+        Vectorized version of normal_with_bias for many instances at once.
 
-        if min_values is not None and max_values is not None:
-            uniform_data = np.random.uniform(low=min_values, high=max_values, size=(self.num_samples, len(instance)))
-        elif self.info_data is not None:
-            i = self.info_data.get('min').values
-            a = self.info_data.get('max').values
-            if i is not None and a is not None:
-                uniform_data = np.random.uniform(low=i, high=a, size=(self.num_samples, len(instance)))
-            else:
-                raise ValueError(f"class {self.__class__.__name__} must have info_data "
-                                 f"different to None or pass min and max values as  parameter")
+        :param instances: An array-like with shape (n_instances, n_features).
+        :return: A contiguous array with shape (n_instances, num_samples, n_features).
+        """
+        instances = np.atleast_2d(np.asarray(instances, dtype=float))
+        std = self._normal_scale(scale, approach_rate)
+
+        noise_set = standard_normal(self.rng, (len(instances), self.num_samples, instances.shape[1]), self.sampler)
+        noise_set *= std
+        noise_set += instances[:, np.newaxis, :]
+
+        min_, max_ = self._clip_bounds()
+        if max_ is not None and min_ is not None:
+            np.clip(noise_set, min_, max_, out=noise_set)
+
+        return noise_set
+
+    def iter_normal_with_bias_batch(self, instances, chunk_size, scale=None, approach_rate=0.15):
+        """
+        Yield normal_with_bias_batch blocks for at most chunk_size instances at a time, keeping
+        peak memory at chunk_size * num_samples * n_features values.
+        """
+        instances = np.atleast_2d(np.asarray(instances, dtype=float))
+        for start in range(0, len(instances), chunk_size):
+            yield self.normal_with_bias_batch(instances[start:start + chunk_size],
+                                              scale=scale,
+                                              approach_rate=approach_rate)
+
+    def iter_normal_with_bias_into(self, out, instance, chunk_size, scale=None, approach_rate=0.15):
+        """
+        Fill the preallocated out array, with shape (num_samples, n_features) and dtype float32 or
+        float64, with the normal_with_bias noise of instance, chunk_size rows at a time and in place,
+        so no temporary array of the whole noise set is created.
+
+        :return: A generator of (start, block) pairs, block being the view of out just filled.
+        """
+        instance = np.asarray(instance, dtype=out.dtype)
+        std = self._normal_scale(scale, approach_rate).astype(out.dtype)
+        min_, max_ = self._clip_bounds()
+        if self.sampler != 'random':
+            # a quasi-random sequence covers the whole noise set, it is drawn at once into out
+            fill_standard_normal(self.rng, out, self.sampler)
+
+        for start in range(0, len(out), chunk_size):
+            block = out[start:start + chunk_size]
+            if self.sampler == 'random':
+                self.rng.standard_normal(out=block, dtype=out.dtype)
+            block *= std
+            block += instance
+            if max_ is not None and min_ is not None:
+                np.clip(block, min_.astype(out.dtype), max_.astype(out.dtype), out=block)
+            yield start, block
+
+    def uniform_distance(self, instance, min_values=None, max_values=None):
+        low, high = self._uniform_bounds(min_values, max_values)
+        if self.sampler == 'random':
+            uniform_data = self.rng.uniform(low=low, high=high, size=(self.num_samples, len(instance)))
         else:
-            raise ValueError(f"class {self.__class__.__name__} must have info_data "
-                             f"different to None or pass min and max values as  parameter")
+            uniform_data = uniform(self.rng, (self.num_samples, len(instance)), self.sampler)
+            uniform_data *= np.asarray(high, dtype=float) - np.asarray(low, dtype=float)
+            uniform_data += np.asarray(low, dtype=float)
 
         distances = np.linalg.norm(uniform_data - instance, axis=1)
 
         return uniform_data, distances
+
+    def uniform_distance_batch(self, instances, min_values=None, max_values=None):
+        """
+        Vectorized version of uniform_distance for many instances at once.
+
+        :param instances: An array-like with shape (n_instances, n_features).
+        :return: The uniform data with shape (n_instances, num_samples, n_features) and
+        the distances to each instance with shape (n_instances, num_samples).
+        """
+        instances = np.atleast_2d(np.asarray(instances, dtype=float))
+        low, high = self._uniform_bounds(min_values, max_values)
+        low, high = np.asarray(low, dtype=float), np.asarray(high, dtype=float)
+
+        uniform_data = uniform(self.rng, (len(instances), self.num_samples, instances.shape[1]), self.sampler)
+        uniform_data *= high - low
+        uniform_data += low
+
+        distances = np.linalg.norm(uniform_data - instances[:, np.newaxis, :], axis=2)
+
+        return uniform_data, distances
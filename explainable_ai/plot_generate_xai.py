@@ -40,6 +40,38 @@ class PltGenerate:
         ax.set_xticks(np.arange(len(names)))
         ax.set_xticklabels(names, rotation=45)
 
+    def _plot_permutation_importance(self, ax):
+        values, std, _, names = self.info_args['permutation_importance']
+        ax.set_axisbelow(True)
+        ax.grid()
+        ax.bar(names, values, yerr=std)
+        ax.set_xticks(np.arange(len(names)))
+        ax.set_xticklabels(names, rotation=45)
+
+    def _plot_ale(self, ax):
+        ale = self.info_args['ale']
+        ax.set_axisbelow(True)
+        ax.grid()
+        for name in ale['feature_names']:
+            ax.plot(ale['edges'][name], ale['ale'][name], marker='.', label=name)
+        ax.axhline(0, color='black', linewidth=0.8)
+        ax.set_ylabel('ALE')
+        ax.legend()
+
+    def _plot_partial_dependence(self, ax):
+        pdp = self.info_args['partial_dependence']
+        ax.set_axisbelow(True)
+        if len(pdp['feature_names']) == 1:
+            ax.grid()
+            ax.plot(pdp['grid'][0], pdp['average'], marker='.')
+            ax.set_xlabel(pdp['feature_names'][0])
+            ax.set_ylabel('Partial dependence')
+        else:
+            contour = ax.contourf(pdp['grid'][1], pdp['grid'][0], pdp['average'])
+            ax.set_xlabel(pdp['feature_names'][1])
+            ax.set_ylabel(pdp['feature_names'][0])
+            ax.figure.colorbar(contour, ax=ax)
+
     def _plot_find_neighborhood(self, ax):
         x, y, c, idx = self.info_args['find_neighborhood']
         size = [25]*len(c)
@@ -54,7 +86,7 @@ class PltGenerate:
 
     def generate_plot_dict(self):
         members = getmembers(self)
-        return {name.strip('_plot_'): member for name, member in members if name.startswith('_plot_')}
+        return {name[len('_plot_'):]: member for name, member in members if name.startswith('_plot_')}
 
     def create_plots(self):
         fig, ax = plt.subplots(nrows=1, ncols=self.n_fig, figsize=self.fig_size, squeeze=False)
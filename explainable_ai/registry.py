@@ -0,0 +1,82 @@
+import importlib
+import subprocess
+import sys
+
+# module defining each algorithm of models.Algorithm, imported the first time the algorithm is requested
+ALGORITHM_MODULES = {'ale': 'explainable_ai.interpretability',
+                     'ensemble': 'explainable_ai.interpretability',
+                     'gpx': 'explainable_ai.explainability',
+                     'knn': 'explainable_ai.interpretability',
+                     'lime': 'explainable_ai.explainability',
+                     'linear': 'explainable_ai.interpretability',
+                     'logit': 'explainable_ai.interpretability',
+                     'shap': 'explainable_ai.explainability',
+                     'tree': 'explainable_ai.interpretability'}
+
+_algorithms = {}
+
+
+def register(name):
+    """
+    Class decorator registering an Understanding subclass as the implementation of an algorithm,
+    named as in models.Algorithm.
+    """
+    if name not in ALGORITHM_MODULES:
+        raise ValueError(f'Algorithm {name} is not in models.Algorithm')
+
+    def decorator(cls):
+        if _algorithms.get(name, cls) is not cls:
+            raise ValueError(f'Algorithm {name} is already registered by {_algorithms[name].__name__}')
+        _algorithms[name] = cls
+        return cls
+    return decorator
+
+
+def get_algorithm(name):
+    """
+    Return the class registered for the algorithm, importing its module on first use.
+    """
+    if name not in _algorithms:
+        if name not in ALGORITHM_MODULES:
+            raise ValueError(f'Algorithm {name} does not exist')
+        importlib.import_module(ALGORITHM_MODULES[name])
+    return _algorithms[name]
+
+
+def registered_algorithms():
+    return dict(_algorithms)
+
+
+def import_time(statement, repeat=5):
+    """
+    Cold import time in seconds of a statement, the best of repeat fresh interpreters.
+    """
+    code = ('import time; start = time.perf_counter(); '
+            f'{statement}; print(time.perf_counter() - start)')
+    return min(float(subprocess.check_output([sys.executable, '-c', code], stderr=subprocess.DEVNULL).decode())
+               for _ in range(repeat))
+
+
+def benchmark_imports(repeat=5):
+    """
+    Cold import time of the explainable_ai modules and of the heavy libraries they import only when
+    an algorithm using them runs.
+    """
+    statements = {'explainable_ai.explainability': 'import explainable_ai.explainability',
+                  'explainable_ai.interpretability': 'import explainable_ai.interpretability',
+                  'shap': 'import shap',
+                  'lime': 'from lime import lime_tabular',
+                  'matplotlib': 'import matplotlib.pyplot',
+                  'explainer.gpx': 'from explainer.gpx import GPX'}
+    results = {}
+    for name, statement in statements.items():
+        try:
+            results[name] = import_time(statement, repeat)
+        except subprocess.CalledProcessError:
+            results[name] = None
+    return results
+
+
+if __name__ == '__main__':
+    for module, seconds in benchmark_imports().items():
+        print(f'{module:<35} {"not installed" if seconds is None else f"{seconds * 1000:8.1f} ms"}')
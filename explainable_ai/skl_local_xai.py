@@ -1,3 +1,8 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 from sklearn.neighbors import KNeighborsClassifier
 
 from juicer.explainable_ai.noise_set import NoiseSet
@@ -6,6 +11,34 @@ from sklearn.tree import DecisionTreeClassifier
 from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
 from sklearn.linear_model import Ridge, LogisticRegression
 
+# LocalXAI shared with the process pool workers of LocalXAI.explain_batch
+_worker_local_xai = None
+
+
+def _init_explain_worker(local_xai):
+    global _worker_local_xai
+    _worker_local_xai = local_xai
+
+
+def _explain_in_worker(instance):
+    return _worker_local_xai.local_explanation(instance)
+
+
+# surrogate model and interpretation of each local_method
+LOCAL_METHODS = {'dt_cls': (DecisionTreeClassifier, TreeInterpretation),
+                 'rf_cls': (RandomForestClassifier, TreeInterpretation),
+                 'rf_reg': (RandomForestRegressor, TreeInterpretation),
+                 'lreg': (lambda: Ridge(alpha=2), LinearRegressionInterpretation),
+                 'logit': (lambda: LogisticRegression(max_iter=1000, tol=1e-1, ), LinearRegressionInterpretation)}
+
+
+def _attribution_ranking(local_method):
+    if hasattr(local_method, 'feature_importances_'):
+        attributions = local_method.feature_importances_
+    else:
+        attributions = np.abs(np.atleast_2d(local_method.coef_)).sum(axis=0)
+    return np.argsort(-attributions, kind='stable')
+
 
 class LocalXAI:
 
@@ -17,25 +50,70 @@ class LocalXAI:
                  noise_num_samples=2500,
                  type_noise='normal',
                  feature_names=None,
-                 target_name=None):
+                 target_name=None,
+                 random_state=None,
+                 profile=None,
+                 chunk_size=None,
+                 dtype=None,
+                 sampler='random',
+                 adaptive=False,
+                 max_noise_num_samples=None,
+                 tolerance=0.01,
+                 convergence='fidelity'):
+        """
+
+        :param chunk_size: If defined, the noise set is generated and predicted chunk_size rows at a
+        time into preallocated arrays, so peak memory is set by the chunk instead of noise_num_samples.
+        :param dtype: Data type of the noise set in the chunked mode, e.g. 'float32' for models that
+        accept it. float64 by default.
+        :param sampler: Sampler of the noise set, one of 'random', 'sobol' or 'lhs' (see NoiseSet).
+        :param adaptive: If True, noise_num_samples is only the first round: the noise set is doubled
+        and the surrogate refitted until it converges or max_noise_num_samples is reached. The number of
+        samples used is returned by local_explanation under 'samples_used'.
+        :param max_noise_num_samples: Noise set size limit of the adaptive mode, 8 * noise_num_samples by default.
+        :param tolerance: Largest change of the surrogate fidelity (score on the noise of the next round,
+        before it is fitted) between rounds that is taken as converged.
+        :param convergence: 'fidelity' stops on the tolerance above, 'rank' when the ranking of the
+        surrogate feature importances (or absolute coefficients) does not change between rounds.
+        """
+        if convergence not in ('fidelity', 'rank'):
+            raise ValueError(f"{self.__class__.__name__} does not know the convergence {convergence}")
 
         self.arguments_used = arguments_used
         self.model_to_understand = model_to_understand
         self.data_source = data_source
+        self.profile = profile
+        if info_data is None and profile is not None:
+            info_data = profile.info_data(feature_names)
         self.info_data = info_data
         self.feature_names = feature_names
         self.target_name = target_name
         self.noise_num_samples = noise_num_samples
         self.type_noise = type_noise
+        self.random_state = random_state
+        self.chunk_size = chunk_size
+        self.dtype = dtype
+        self.sampler = sampler
+        self.adaptive = adaptive
+        self.max_noise_num_samples = max_noise_num_samples or 8 * noise_num_samples
+        self.tolerance = tolerance
+        self.convergence = convergence
+        self.samples_used = None
 
-    def create_noise_set(self, instance):
+    def _noise_set(self):
         if self.info_data is not None:
-            ns = NoiseSet(num_samples=self.noise_num_samples, info_data=self.info_data)
+            return NoiseSet(num_samples=self.noise_num_samples, info_data=self.info_data,
+                            random_state=self.random_state, sampler=self.sampler)
         elif self.data_source is not None:
-            ns = NoiseSet(num_samples=self.noise_num_samples, x_data=self.data_source)
+            return NoiseSet(num_samples=self.noise_num_samples, x_data=self.data_source,
+                            random_state=self.random_state, sampler=self.sampler)
         else:
             raise ValueError(f"{self.__class__.__name__} must define info_data or data_source")
 
+    def create_noise_set(self, instance, ns=None):
+        if ns is None:
+            ns = self._noise_set()
+
         if self.type_noise == 'normal':
             ar = self.arguments_used.get("approach_rate")
             if ar is not None:
@@ -45,69 +123,157 @@ class LocalXAI:
         else:
             raise ValueError(f"{self.__class__.__name__} does not know how to handle with type_noise: {self.type_noise}")
 
-    def local_explanation(self, instance):
-        x_noise = self.create_noise_set(instance)
-        y_noise = self.model_to_understand.predict(x_noise)
+    def create_noise_set_batch(self, instances, chunk_size=None):
+        """
+        Create the noise sets of many instances at once.
 
-        local_method_type = self.arguments_used.get('local_method')
-
-        if local_method_type == "dt_cls":
-            local_args = self.arguments_used.get('local_args')
-            local_method = DecisionTreeClassifier()
-            local_method.fit(x_noise, y_noise)
-            xai_tree = TreeInterpretation(arguments_used=local_args,
-                                          model_to_understand=local_method,
-                                          feature_names=self.feature_names)
-            xai_tree.generate_arguments()
-            return xai_tree.generated_args_dict
-
-        elif local_method_type == "rf_cls":
-            local_args = self.arguments_used.get('local_args')
-            local_method = RandomForestClassifier()
-            local_method.fit(x_noise, y_noise)
-            xai_tree = TreeInterpretation(arguments_used=local_args,
-                                          model_to_understand=local_method,
-                                          feature_names=self.feature_names)
-            xai_tree.generate_arguments()
-            return xai_tree.generated_args_dict
-
-        elif local_method_type == "rf_reg":
-            local_args = self.arguments_used.get('local_args')
-            local_method = RandomForestRegressor()
-            local_method.fit(x_noise, y_noise)
-            xai_tree = TreeInterpretation(arguments_used=local_args,
-                                          model_to_understand=local_method,
-                                          feature_names=self.feature_names)
-            xai_tree.generate_arguments()
-            return xai_tree.generated_args_dict
-
-        elif local_method_type == "lreg":
-            local_args = self.arguments_used.get('local_args')
-            local_method = Ridge(alpha=2)
-            local_method.fit(x_noise, y_noise)
-            xai_tree = LinearRegressionInterpretation(arguments_used=local_args,
-                                                      model_to_understand=local_method,
-                                                      feature_names=self.feature_names)
-            xai_tree.generate_arguments()
-            return xai_tree.generated_args_dict
-
-        elif local_method_type == "logit":
-            local_args = self.arguments_used.get('local_args')
-            local_method = LogisticRegression(max_iter=1000, tol=1e-1, )
-            local_method.fit(x_noise, y_noise)
-            xai_tree = LinearRegressionInterpretation(arguments_used=local_args,
-                                                      model_to_understand=local_method,
-                                                      feature_names=self.feature_names)
-            xai_tree.generate_arguments()
-            return xai_tree.generated_args_dict
+        :param instances: An array-like with shape (n_instances, n_features).
+        :param chunk_size: If defined, a generator of blocks with at most chunk_size instances is returned.
+        :return: An array with shape (n_instances, noise_num_samples, n_features) or a generator of such blocks.
+        """
+        ns = self._noise_set()
 
+        if self.type_noise == 'normal':
+            ar = self.arguments_used.get("approach_rate", 0.15)
+            if chunk_size is not None:
+                return ns.iter_normal_with_bias_batch(instances=instances, chunk_size=chunk_size, approach_rate=ar)
+            return ns.normal_with_bias_batch(instances=instances, approach_rate=ar)
         else:
+            raise ValueError(f"{self.__class__.__name__} does not know how to handle with type_noise: {self.type_noise}")
+
+    def create_noise_set_chunked(self, instance):
+        """
+        Create the noise set of instance and its predictions chunk_size rows at a time, writing both
+        into preallocated arrays of dtype.
+
+        :return: The noise set with shape (noise_num_samples, n_features) and its predictions.
+        """
+        return self._sample_and_predict(self._noise_set(), instance, self.noise_num_samples)
+
+    def _sample_and_predict(self, ns, instance, num_samples):
+        x_noise = np.empty((num_samples, len(instance)), dtype=self.dtype or np.float64)
+        return x_noise, self._sample_and_predict_into(ns, instance, x_noise)
+
+    def _sample_and_predict_into(self, ns, instance, x_out, y_out=None):
+        """
+        Fill x_out, a preallocated array with shape (num_samples, n_features), with the noise set of
+        instance and y_out with its predictions, allocated on the first predictions when None.
+
+        :return: y_out.
+        """
+        if self.chunk_size is None:
+            ns.num_samples = len(x_out)
+            x_out[:] = self.create_noise_set(instance, ns)
+            predictions = self.model_to_understand.predict(x_out)
+            if y_out is None:
+                return predictions
+            y_out[:] = predictions
+            return y_out
+
+        if self.type_noise != 'normal':
+            raise ValueError(f"{self.__class__.__name__} does not know how to handle with type_noise: {self.type_noise}")
+        for start, block in ns.iter_normal_with_bias_into(out=x_out,
+                                                          instance=instance,
+                                                          chunk_size=self.chunk_size,
+                                                          approach_rate=self.arguments_used.get("approach_rate", 0.15)):
+            predictions = self.model_to_understand.predict(block)
+            if y_out is None:
+                y_out = np.empty((len(x_out),) + predictions.shape[1:], dtype=predictions.dtype)
+            y_out[start:start + len(block)] = predictions
+            del predictions
+        return y_out
+
+    def _local_method(self):
+        local_method_type = self.arguments_used.get('local_method')
+        if local_method_type not in LOCAL_METHODS:
             raise ValueError(f"{self.__class__.__name__} does not how to "
                              f"handle with local method {local_method_type}")
+        return LOCAL_METHODS[local_method_type]
+
+    def _fit_adaptive(self, instance, estimator):
+        """
+        Fit the surrogate on a noise set doubled in rounds. Before a round is added to the noise set,
+        the surrogate fitted so far is scored on it (R2 or accuracy on unseen noise). The noise set
+        and its predictions are allocated once with max_noise_num_samples rows and filled a round at a time.
+        """
+        ns = self._noise_set()
+        stop = min(self.noise_num_samples, self.max_noise_num_samples)
+        x_noise = np.empty((self.max_noise_num_samples, len(instance)), dtype=self.dtype or np.float64)
+        y_first = self._sample_and_predict_into(ns, instance, x_noise[:stop])
+        y_noise = np.empty((len(x_noise),) + y_first.shape[1:], dtype=y_first.dtype)
+        y_noise[:stop] = y_first
+        del y_first
+        local_method = estimator().fit(x_noise[:stop], y_noise[:stop])
+        ranking, fidelity = _attribution_ranking(local_method), None
 
+        while stop < self.max_noise_num_samples:
+            start, stop = stop, min(2 * stop, self.max_noise_num_samples)
+            self._sample_and_predict_into(ns, instance, x_noise[start:stop], y_noise[start:stop])
+            round_fidelity = local_method.score(x_noise[start:stop], y_noise[start:stop])
+            local_method = estimator().fit(x_noise[:stop], y_noise[:stop])
+
+            round_ranking = _attribution_ranking(local_method)
+            if self.convergence == 'fidelity':
+                converged = fidelity is not None and abs(round_fidelity - fidelity) <= self.tolerance
+            else:
+                converged = np.array_equal(round_ranking, ranking)
+            ranking, fidelity = round_ranking, round_fidelity
+            if converged:
+                break
+
+        self.samples_used = stop
+        return local_method
+
+    def local_explanation(self, instance):
+        """
+        Explain instance with a local surrogate fitted on its noise set.
+
+        :return: The generated_args_dict of the surrogate interpretation, plus the size of the noise
+        set under 'samples_used', which varies per instance in the adaptive mode.
+        """
+        estimator, interpretation = self._local_method()
+
+        if self.adaptive:
+            local_method = self._fit_adaptive(instance, estimator)
+        else:
+            if self.chunk_size is not None:
+                x_noise, y_noise = self.create_noise_set_chunked(instance)
+            else:
+                x_noise = self.create_noise_set(instance)
+                y_noise = self.model_to_understand.predict(x_noise)
+            local_method = estimator().fit(x_noise, y_noise)
+            self.samples_used = len(x_noise)
 
+        xai = interpretation(arguments_used=self.arguments_used.get('local_args'),
+                             model_to_understand=local_method,
+                             feature_names=self.feature_names)
+        xai.generate_arguments()
+        return {**xai.generated_args_dict, 'samples_used': self.samples_used}
 
+    def explain_batch(self, instances, n_jobs=None, chunksize=16):
+        """
+        Explain many instances spreading them across a process pool.
 
+        The LocalXAI (model and data source included) is handed to each worker once, at start-up,
+        and is shared copy-on-write where the platform forks processes. Results are yielded in the
+        same order as instances as soon as they are ready. With a fixed random_state every instance
+        gets the same explanation it would get from local_explanation, whatever worker runs it.
 
+        :param instances: An iterable of instances.
+        :param n_jobs: Number of worker processes, None or -1 for all CPUs and 1 to run serially.
+        :param chunksize: Number of instances sent to a worker at a time.
+        """
+        if n_jobs is None or n_jobs < 0:
+            n_jobs = os.cpu_count()
 
+        if n_jobs == 1:
+            for instance in instances:
+                yield self.local_explanation(instance)
+            return
 
+        start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=n_jobs,
+                                 mp_context=multiprocessing.get_context(start_method),
+                                 initializer=_init_explain_worker,
+                                 initargs=(self,)) as executor:
+            yield from executor.map(_explain_in_worker, instances, chunksize=chunksize)
@@ -1,7 +1,51 @@
-from inspect import getmembers
+import multiprocessing
+import os
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import pandas as pd
 
+# Understanding shared with the process pool workers of Understanding.generate_arguments
+_worker_understanding = None
+
+
+def _init_generate_worker(understanding, trace_memory):
+    global _worker_understanding
+    _worker_understanding = understanding
+    if trace_memory:
+        tracemalloc.start()
+
+
+def _generate_in_worker(arg, param, trace_memory):
+    return _timed_call(_worker_understanding.uai_members[arg], param, trace_memory, time.process_time, True)
+
+
+def _timed_call(member, param, trace_memory, cpu_clock, reset_peak):
+    """
+    Run a _uai_ member and measure its wall time, CPU time and, when memory is traced, the peak of
+    memory allocated above what was allocated when it started.
+    """
+    if trace_memory:
+        if reset_peak:
+            tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+    start_wall, start_cpu = time.perf_counter(), cpu_clock()
+    result = member(**param)
+    timing = {'wall_time': time.perf_counter() - start_wall,
+              'cpu_time': cpu_clock() - start_cpu,
+              'peak_memory': tracemalloc.get_traced_memory()[1] - start_memory if trace_memory else None}
+    return result, timing
+
+
+def _collect_understanding_members(cls):
+    names = {}
+    for klass in reversed(cls.__mro__):
+        for attr in vars(klass):
+            if attr.startswith('_uai_'):
+                names[attr[len('_uai_'):]] = attr
+    return names
+
 
 class Understanding:
 
@@ -33,7 +77,7 @@ class Understanding:
         self.target_name = target_name
         self.feature_names = feature_names
         self.generated_args_dict = None
-
+        self.generated_args_timing = None
 
     @property
     def data_source(self):
@@ -79,19 +123,64 @@ class Understanding:
         else:
             raise ValueError(f'{self.__class__.__name__} class does not have features name')
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._understanding_members = _collect_understanding_members(cls)
+
     def _get_uai_members(self):
-        members = getmembers(self)
-        return {name.strip('_uai_'): member for name, member in members if name.startswith('_uai')}
+        # member names are collected once per class, only the bound methods are created here
+        return {name: getattr(self, attr) for name, attr in self._understanding_members.items()}
 
-    def generate_arguments(self):
+    def generate_arguments(self, n_jobs=1, executor='thread', trace_memory=False):
         """
         This method execute all understander routines and create a dictionary with the results.
 
+        :param n_jobs: Number of routines executed concurrently, None or -1 for all CPUs.
+        :param executor: 'thread' runs routines in a thread pool, which suits the ones spending their
+        time in numpy or the model, 'process' in a process pool, which the Understanding is handed to once.
+        :param trace_memory: Measure the peak memory of each routine with tracemalloc. It slows the
+        routines down and, in a thread pool, the peak includes the routines running at the same time.
+        :return: The generated_args_dict and a timing dictionary with the wall time, CPU time (of the
+        routine thread, or of the whole process when it runs alone in it) and peak memory of each routine.
         """
-        self.generated_args_dict = {arg: self.uai_members[arg](**param) for arg, param in self.arguments_used.items()}
+        if executor not in ('thread', 'process'):
+            raise ValueError(f"{self.__class__.__name__} class doesnt know the executor {executor}")
+        if n_jobs is None or n_jobs < 0:
+            n_jobs = os.cpu_count()
+        n_jobs = min(n_jobs, len(self.arguments_used)) or 1
+
+        started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        try:
+            if n_jobs == 1:
+                results = {arg: _timed_call(self.uai_members[arg], param, trace_memory, time.process_time, True)
+                           for arg, param in self.arguments_used.items()}
+            elif executor == 'thread':
+                with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+                    futures = {arg: pool.submit(_timed_call, self.uai_members[arg], param, trace_memory,
+                                                time.thread_time, False)
+                               for arg, param in self.arguments_used.items()}
+                    results = {arg: future.result() for arg, future in futures.items()}
+            else:
+                start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+                with ProcessPoolExecutor(max_workers=n_jobs,
+                                         mp_context=multiprocessing.get_context(start_method),
+                                         initializer=_init_generate_worker,
+                                         initargs=(self, trace_memory)) as pool:
+                    futures = {arg: pool.submit(_generate_in_worker, arg, param, trace_memory)
+                               for arg, param in self.arguments_used.items()}
+                    results = {arg: future.result() for arg, future in futures.items()}
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+
+        self.generated_args_dict = {arg: result for arg, (result, _) in results.items()}
+        self.generated_args_timing = {arg: timing for arg, (_, timing) in results.items()}
+        return self.generated_args_dict, self.generated_args_timing
 
     def _uai_feature_importance(self):
         pass
 
 
-
+Understanding._understanding_members = _collect_understanding_members(Understanding)
@@ -1,6 +1,6 @@
 import enum
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, Enum, Integer, String, Boolean, ForeignKey, DateTime, JSON
+from sqlalchemy import Column, Enum, Integer, BigInteger, String, Boolean, ForeignKey, DateTime, JSON
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -10,6 +10,11 @@ class TaskType(enum.Enum):
     classification = "classification"
     regression = "regression"
 
+class InspectionStatus(enum.Enum):
+    pending = "pending"
+    success = "success"
+    failure = "failure"
+
 class Datasource(db.Model):
     """ Datasource persisted informations """
     __tablename__ = 'datasource'
@@ -25,6 +30,10 @@ class Datasource(db.Model):
     data_format = Column(String(128))
     estimated_rows = Column(Integer)
     estimated_size_mb = Column(Integer)
+    digest = Column(String(64), index=True)
+    size_bytes = Column(BigInteger)
+    inspection_status = Column(Enum(InspectionStatus))
+    inspection_message = Column(String(1024))
     created = Column(DateTime, default=func.now(), nullable=False)
     updated = Column(DateTime, default=func.now(), nullable=False, onupdate=func.now())
 
@@ -37,6 +46,8 @@ class Model(db.Model):
     description = Column(String(512), nullable=True)
     enabled = Column(Boolean, default=True, nullable=False)
     uri = Column(String(512), nullable=False)
+    digest = Column(String(64), index=True)
+    size_bytes = Column(BigInteger)
     created = Column(DateTime, default=func.now(), nullable=False)
     updated = Column(DateTime, default=func.now(), nullable=False, onupdate=func.now())
 
@@ -2,7 +2,7 @@ from http import HTTPStatus
 from flask_restx import Namespace, Resource, inputs
 from logger import setup_logger
 from xai_api.api_models.lime_model import lime_input
-from xai_api.api_models.knn_model import features_model_knn as knn_input
+from xai_api.api_models.knn_model import knn_input
 from xai_api.api_models.tree_model import tree_input
 from xai_api.api_models.gpx_model import gpx_input
 from xai_api.api_models.ale_model import ale_input
@@ -229,16 +229,12 @@ class KNN(Resource):
         super().__init__(api, *args, **kwargs)
         self.human_name = "KNN"
 
-    @ns.expect(knn_input)
+    @ns.expect(knn_input, validate=True)
     def post(self, understanding_id): 
         """
-        # aparentemente sem implementação
+        ================ FEITO ===================== (IMAGE,RAW)
         """
-        result, result_code = {
-            "status": "ERROR",
-            "message": "Missing json in the request body"
-        }, HTTPStatus.BAD_REQUEST
-        
-        request = ns.payload
-        
-        return result, result_code
\ No newline at end of file
+        result, result_code = _generic_algorithm_post(payload=ns.payload, 
+                                                      understanding_id=understanding_id,
+                                                      algorithm=self.human_name)
+        return result, result_code
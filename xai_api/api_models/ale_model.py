@@ -3,7 +3,12 @@ from xai_api.main_api import api
 from .model_datasource_model import analysis_input
 
 ale_arguments = api.model('ale_features', {
-    'which_feature': fields.String(description='Feature name to be analyzed'),
+    'which_feature': fields.String(description='Feature name to be analyzed, all features if missing'),
+    'n_bins': fields.Integer(description='Number of quantile bins of each feature', default=20),
+    'second_order': fields.List(fields.String, min_items=2, max_items=2,
+                                description='Pair of features whose second order effect is computed'),
+    'class_index': fields.Integer(description='Class explained for classifiers, the last one by default'),
+    'max_batch_rows': fields.Integer(description='Maximum number of rows of each model prediction call'),
     },
     strict=True)
 
@@ -4,6 +4,12 @@ from .model_datasource_model import analysis_input
 
 gpx_arguments = api.model('gpx_features', {
     'instance': fields.List(fields.Float(description='Instance data')),
+    'preset': fields.String(description='Solver hyperparameter preset',
+                            enum=['fast', 'balanced', 'accurate'], default='balanced'),
+    'time_budget': fields.Float(description='Wall-clock budget of the evolution in seconds (operon only)'),
+    'max_evaluations': fields.Integer(description='Maximum number of fitness evaluations of the evolution'),
+    'warm_start': fields.Boolean(description='Start from the population evolved for the nearest explained instance '
+                                             'of the same understanding (gplearn only)', default=False),
     },
     strict=True) 
 
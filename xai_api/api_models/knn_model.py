@@ -1,16 +1,19 @@
 from flask_restx import fields
 from xai_api.main_api import api
+from .model_datasource_model import analysis_input
 
-features_model_knn = api.model('features_knn', {
-    'which_feature': fields.String(description='Feature to analyze for importance'),
-})
+knn_arguments = api.model('knn_features', {
+    'instance': fields.List(fields.Float(description='Instance data')),
+    'instances': fields.List(fields.List(fields.Float),
+                             description='Batch of instances whose neighbourhoods are found in a single query'),
+    'n_neighbors': fields.Integer(description='Number of neighbours of each instance', default=20),
+    'index_algorithm': fields.String(description='Neighbour index, approximate search needs pynndescent',
+                                     enum=['auto', 'kd_tree', 'ball_tree', 'approximate'], default='auto'),
+    },
+    strict=True)
 
-info_model_knn = api.model('info_knn', {
-    'feature_importance': fields.Nested(features_model_knn, description='Feature importance details'),
-})
-
-knn_model_input = api.model('logit_knn', {
-    'model_path': fields.String(description='Model location'),
-    'data_path': fields.String(description='Data location'),
-    'info_args': fields.Nested(info_model_knn, description='Additional information arguments'),
-})
+knn_input = api.model('knn_input', {
+    'arguments': fields.Nested(knn_arguments, description='Arguments for KNN algorithm'),
+    'metadata': fields.Nested(analysis_input, description='Metadata for analysis'),
+    },
+    strict=True)
@@ -5,6 +5,23 @@ from .model_datasource_model import analysis_input
 lime_arguments = api.model('lime_features', {
     'instance': fields.List(fields.Float(description='Instance data')),
     'n_feature': fields.Integer(description='Number of features to be analyzed'),
+    'instances': fields.List(fields.List(fields.Float),
+                             description='Batch of instances explained together by the vectorized LIME'),
+    'num_samples': fields.Integer(description='Number of perturbations of each instance', default=5000),
+    'kernel_width': fields.Float(description='Width of the exponential kernel, by default 0.75 * sqrt(n_features)'),
+    'discretize_continuous': fields.Boolean(description='Discretize continuous features into quartiles',
+                                            default=True),
+    'max_rows': fields.Integer(description='Maximum number of rows of each model prediction call'),
+    'sampler': fields.String(description='Sampler of the perturbations of a batch of instances',
+                             enum=['random', 'sobol', 'lhs'], default='random'),
+    'adaptive': fields.Boolean(description='Grow the perturbations of each instance of a batch until its '
+                                           'surrogate converges, num_samples being the limit', default=False),
+    'initial_samples': fields.Integer(description='Perturbations of each instance in the first adaptive round',
+                                      default=500),
+    'tolerance': fields.Float(description='Largest change of the surrogate fidelity taken as converged',
+                              default=0.01),
+    'convergence': fields.String(description='Stop on the surrogate fidelity or on the ranking of its coefficients',
+                                 enum=['fidelity', 'rank'], default='fidelity'),
     },
     strict=True)
 
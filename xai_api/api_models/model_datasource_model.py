@@ -69,6 +69,10 @@ datasource_output = api.model('datasource_output', {
     'data_format': fields.String(description='Format of the datasource data'),
     'estimated_rows': fields.Integer(description='Estimated number of rows in the datasource'),
     'estimated_size_mb': fields.Integer(description='Estimated size of the datasource in MB'),
+    'digest': fields.String(description='SHA-256 digest of the datasource file'),
+    'size_bytes': fields.Integer(description='Size of the datasource file in bytes'),
+    'inspection_status': fields.String(description='Status of the background inspection of the datasource: "pending", "success" or "failure"'),
+    'inspection_message': fields.String(description='Error of the background inspection of the datasource, if it failed'),
     'created': fields.DateTime(description='Creation timestamp of the datasource', dt_format='iso8601'),
     'updated': fields.DateTime(description='Last updated timestamp of the datasource', dt_format='iso8601')
  })
@@ -3,8 +3,10 @@ from xai_api.main_api import api
 from .model_datasource_model import analysis_input
 
 shap_arguments = api.model('shap_features', {
-    'shap_type_xai': fields.String(description='Type of SHAP for XAI'),
+    'shap_type_xai': fields.String(description='Type of SHAP for XAI: waterfall, bar or raw'),
     'instance': fields.List(fields.Float(description='Instance data')),
+    'instances': fields.List(fields.List(fields.Float(description='Instance data')),
+                             description='Batch of instances explained by a single call (raw only)'),
     },
     strict=True)
 
@@ -23,13 +23,22 @@ def make_celery(app_name):
                             'allow_create_topics': True
                         })
 
+    # tarefas sobre os arquivos cadastrados (xai_api.resource_tasks) consumidas por um worker do peel-back,
+    # as explicacoes seguem na fila padrao do peel-worker
+    resource_queue = f'{topic_name}-resources'
+
     celery_app.conf.task_default_queue = topic_name
     celery_app.conf.task_queues = {
         topic_name: {
             'exchange': topic_name,
             'routing_key': topic_name,
         },
+        resource_queue: {
+            'exchange': resource_queue,
+            'routing_key': resource_queue,
+        },
     }
+    celery_app.conf.task_routes = {'xai_api.resource_tasks.*': {'queue': resource_queue}}
 
     return celery_app
 
@@ -4,13 +4,17 @@ from xai_api.api_models.model_datasource_model import datasource_input
 from http import HTTPStatus
 
 from xai_api.schema import DataSourceItemResponseSchema, DatasourceCreateRequestSchema, DatasourceUpdateRequestSchema
-from models import db, Datasource as datasource_model
+from models import db, Datasource as datasource_model, InspectionStatus
+from xai_api.resource_tasks import inspect_datasource
+from xai_resource.file_digest import read_digest
+from xai_resource.inspect_datasource import estimate_csv_rows, infer_csv_schema
+from xai_resource.parquet_datasource import count_parquet_rows, infer_parquet_schema
 
 from sqlalchemy import func, or_
+import ast
 import os.path
 import csv
 import math
-import pandas as pd
 import numpy as np
 
 
@@ -39,6 +43,7 @@ list_parser.add_argument('sort', default=['name','id'],
 
 logger = setup_logger()
 
+
 @ns.route('/list')
 class DatasourceList(Resource):
 
@@ -111,6 +116,15 @@ class Datasource(Resource):
         super().__init__(api, *args, **kwargs)
         self.human_name = "Datasource"
 
+    def send_inspection(self, datasource_obj, target_name):
+        try:
+            inspect_datasource.delay(datasource_obj.id, datasource_obj.uri, target_name, datasource_obj.data_format)
+        except Exception as e:
+            logger.error(f"[{self.__class__.__name__}] Could not send the inspection of {datasource_obj.uri}: {e}")
+            datasource_obj.inspection_status = InspectionStatus.failure
+            datasource_obj.inspection_message = str(e)[:1024]
+            db.session.commit()
+
     @ns.expect(parser, validate=True)
     def get(self):
         """
@@ -159,13 +173,19 @@ class Datasource(Resource):
                 return result, result_code
 
             datasource.data_format = datasource.uri.split('.')[-1]
-            datasource.estimated_size_mb = os.path.getsize(datasource.uri)/1024
-
-            myfile = pd.read_csv(datasource.uri)
-            datasource.estimated_rows = myfile.shape[0]
-
-            # converte todos os tipos para string
-            dtypes_dict = {col: str(dtype) for col, dtype in myfile.dtypes.to_dict().items()}
+            datasource.estimated_size_mb = math.ceil(os.path.getsize(datasource.uri) / 1024 ** 2)
+            # digest guardado no upload, senao calculado por inspect_datasource
+            datasource.digest, datasource.size_bytes = read_digest(datasource.uri)
+
+            if datasource.data_format == 'parquet':
+                # tipos e linhas lidos dos metadados do arquivo
+                datasource.estimated_rows = count_parquet_rows(datasource.uri)
+                dtypes_dict = infer_parquet_schema(datasource.uri)
+            else:
+                # tipos inferidos e linhas estimadas a partir do inicio do arquivo, a contagem exata
+                # e o perfil sao feitos pela tarefa inspect_datasource depois da resposta
+                datasource.estimated_rows = estimate_csv_rows(datasource.uri)
+                dtypes_dict = infer_csv_schema(datasource.uri)
 
             # seta o target certo
             if datasource.target and datasource.target in dtypes_dict.keys():
@@ -177,13 +197,17 @@ class Datasource(Resource):
                 datasource.task_type = "classification" if list(datasource.target.values())[0] == "object" else "regression"
 
             datasource.features = str({col: dtype for col, dtype in dtypes_dict.items() if col not in datasource.target})
+            target_name = list(datasource.target)[0]
             datasource.target = str(datasource.target)
 
             logger.debug(f"[{self.__class__.__name__}] Adding {self.human_name}")
 
+            datasource.inspection_status = InspectionStatus.pending
             db.session.add(datasource)
             db.session.commit()
 
+            self.send_inspection(datasource, target_name)
+
             result = response_schema.dump(datasource)
             result_code = HTTPStatus.CREATED
             
@@ -216,11 +240,20 @@ class Datasource(Resource):
                 if hasattr(datasource_obj, key) and key != '_sa_instance_state':
                     setattr(datasource_obj, key, value)
 
+            reinspect = datasource.uri is not None and os.path.isfile(datasource.uri)
+            if reinspect:
+                datasource_obj.data_format = datasource.uri.split('.')[-1]
+                # digest guardado no upload, senao calculado pela tarefa inspect_datasource
+                datasource_obj.digest, datasource_obj.size_bytes = read_digest(datasource.uri)
+                datasource_obj.inspection_status = InspectionStatus.pending
+                datasource_obj.inspection_message = None
             datasource_obj.updated = func.now()
 
             logger.debug(f"[{self.__class__.__name__}] Updating {self.human_name}")
             
             db.session.commit()
+            if reinspect:
+                self.send_inspection(datasource_obj, list(ast.literal_eval(datasource_obj.target))[0])
             result = response_schema.dump(datasource_obj)
             result_code = HTTPStatus.CREATED
             
@@ -53,7 +53,8 @@ task_ids = {Algorithm.shap : 'task_manager.shap_tasks.shap_exec',
             Algorithm.ensemble: 'task_manager.ensemble_tasks.ensemble_exec',
             Algorithm.logit: 'task_manager.logit_tasks.logit_exec',
             Algorithm.linear: 'task_manager.linear_tasks.linear_exec',
-            Algorithm.lime: 'task_manager.lime_tasks.lime_exec'}
+            Algorithm.lime: 'task_manager.lime_tasks.lime_exec',
+            Algorithm.knn: 'task_manager.knn_tasks.knn_exec'}
 
 @ns.route('/<int:understanding_id>/list')
 class ExplanationList(Resource):
@@ -216,6 +217,10 @@ class ExplanationRun(Resource):
             if "instance" in algorithm_arguments.keys():
                 algorithm_arguments["instance"] = [feature_types_parser[feature_type](feature_val) for feature_type, feature_val in list(zip(list(features_types.values()), algorithm_arguments['instance']))]
 
+            if "instances" in algorithm_arguments.keys():
+                algorithm_arguments["instances"] = [[feature_types_parser[feature_type](feature_val) for feature_type, feature_val in zip(features_types.values(), instance)]
+                                                    for instance in algorithm_arguments['instances']]
+
 
             explanation_run_info = {
                 "explanation_id": explanation_id,
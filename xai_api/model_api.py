@@ -6,6 +6,8 @@ from http import HTTPStatus
 
 from xai_api.schema import ModelItemResponseSchema, ModelCreateRequestSchema, ModelUpdateRequestSchema
 from models import db, Model as model_model
+from xai_api.resource_tasks import digest_model
+from xai_resource.file_digest import read_digest
 
 from sqlalchemy import func, or_
 import os.path
@@ -110,6 +112,15 @@ class Model(Resource):
         super().__init__(api, *args, **kwargs)
         self.human_name = "Model"
 
+    def send_digest(self, model_obj):
+        # digest de um arquivo que nao veio pelo uploader, calculado fora da requisicao
+        if model_obj.digest is not None:
+            return
+        try:
+            digest_model.delay(model_obj.id, model_obj.uri)
+        except Exception as e:
+            logger.error(f"[{self.__class__.__name__}] Could not send the digest of {model_obj.uri}: {e}")
+
     @ns.expect(parser, validate=True)
     def get(self):
         """
@@ -157,10 +168,14 @@ class Model(Resource):
                 result['message'] = "URI passed doesn't correspond to a file in the system."
                 return result, result_code
 
+            # digest guardado no upload, senao calculado pela tarefa digest_model depois da resposta
+            model.digest, model.size_bytes = read_digest(model.uri)
+
             logger.debug(f"[{self.__class__.__name__}] Adding {self.human_name}")
 
             db.session.add(model)
             db.session.commit()
+            self.send_digest(model)
 
             result = response_schema.dump(model)
             result_code = HTTPStatus.CREATED
@@ -195,11 +210,15 @@ class Model(Resource):
                 if hasattr(model_obj, key) and key != '_sa_instance_state':
                     setattr(model_obj, key, value)
 
+            if model.uri is not None and os.path.isfile(model.uri):
+                model_obj.digest, model_obj.size_bytes = read_digest(model.uri)
             model_obj.updated = func.now()
 
             logger.debug(f"[{self.__class__.__name__}] Updating {self.human_name}")
             
             db.session.commit()
+            if model.uri is not None and os.path.isfile(model.uri):
+                self.send_digest(model_obj)
             result = response_schema.dump(model_obj)
             result_code = HTTPStatus.CREATED
             
@@ -0,0 +1,96 @@
+"""
+Tarefas em background sobre os arquivos cadastrados, fora das requisições da API. São roteadas para a
+fila <BROKER_TOPIC>-resources e executadas por um worker do peel-back:
+
+    celery -A xai_api.resource_tasks worker -Q <BROKER_TOPIC>-resources
+"""
+from logger import setup_logger
+from models import db, Datasource as datasource_model, InspectionStatus, Model as model_model
+from explainable_ai.data_profile import DataProfile
+from xai_api.celery_config.celery_setup import celery_instance
+from xai_resource.columnar_cache import ensure_arrow_cache, iter_arrow_cache
+from xai_resource.file_digest import file_digest
+from xai_resource.parquet_datasource import iter_parquet_datasource
+
+logger = setup_logger()
+
+_flask_app = None
+
+
+def flask_app():
+    # criado no worker na primeira tarefa; app_factory importa a API, que importa este modulo
+    global _flask_app
+    if _flask_app is None:
+        from app_factory import create_app
+        _flask_app = create_app()
+    return _flask_app
+
+
+@celery_instance.task
+def inspect_datasource(datasource_id, uri, target_name, data_format='csv'):
+    """
+    Calcula o digest do datasource quando ele nao veio pelo uploader, cria sua copia em Arrow lida
+    pelos workers e seu perfil estatistico. O perfil da o numero exato de linhas, que substitui o
+    estimado no cadastro. O resultado, sucesso ou erro, fica em inspection_status do datasource.
+    """
+    with flask_app().app_context():
+        try:
+            datasource_obj = db.session.get(datasource_model, datasource_id)
+            if datasource_obj is None or datasource_obj.uri != uri:
+                # datasource removido ou apontando para outro arquivo desde o envio da tarefa
+                return
+            try:
+                if datasource_obj.digest is None:
+                    datasource_obj.digest, datasource_obj.size_bytes = file_digest(uri)
+                    db.session.commit()
+
+                if data_format == 'parquet':
+                    chunks = iter_parquet_datasource(uri)
+                else:
+                    try:
+                        ensure_arrow_cache(uri)
+                        chunks = iter_arrow_cache(uri)
+                    except Exception as e:
+                        logger.warning(f"[inspect_datasource] Could not write the Arrow file of {uri}: {e}")
+                        chunks = None
+
+                # perfil estatistico reutilizado pelos explicadores (NoiseSet, LIME e SHAP)
+                if chunks is not None:
+                    profile = DataProfile.from_chunks(chunks, target_name=target_name)
+                else:
+                    profile = DataProfile.from_csv(uri, target_name=target_name)
+                profile.save(DataProfile.path_for(uri))
+                datasource_obj.estimated_rows = profile.n_rows
+                datasource_obj.inspection_status = InspectionStatus.success
+                datasource_obj.inspection_message = None
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"[inspect_datasource] Could not inspect {uri}: {e}")
+                datasource_obj.inspection_status = InspectionStatus.failure
+                datasource_obj.inspection_message = str(e)[:1024]
+                db.session.commit()
+                raise
+        finally:
+            db.session.remove()
+
+
+@celery_instance.task
+def digest_model(model_id, uri):
+    """
+    Calcula o digest e o tamanho de um modelo que nao veio pelo uploader, lendo o arquivo em partes.
+    """
+    with flask_app().app_context():
+        try:
+            model_obj = db.session.get(model_model, model_id)
+            if model_obj is None or model_obj.uri != uri:
+                # modelo removido ou apontando para outro arquivo desde o envio da tarefa
+                return
+            model_obj.digest, model_obj.size_bytes = file_digest(uri)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"[digest_model] Could not compute the digest of {uri}: {e}")
+            raise
+        finally:
+            db.session.remove()
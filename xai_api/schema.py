@@ -2,7 +2,7 @@
 
 import json
 from marshmallow import Schema, post_dump, post_load, fields, EXCLUDE, pre_dump
-from models import Algorithm, Datasource, InfoArguments, Model, Understanding, TaskType
+from models import Algorithm, Datasource, InfoArguments, InspectionStatus, Model, Understanding, TaskType
 from xai_api.main_api import api
 from xai_api.util import changeTimezone
 
@@ -84,6 +84,10 @@ class DataSourceItemResponseSchema(BaseSchema):
     data_format = fields.String()
     estimated_rows = fields.Integer()
     estimated_size_mb = fields.Integer()
+    digest = fields.String()
+    size_bytes = fields.Integer()
+    inspection_status = fields.Enum(enum=InspectionStatus)
+    inspection_message = fields.String()
     
     created = fields.DateTime()
     updated = fields.DateTime()
@@ -107,6 +111,8 @@ class ModelItemResponseSchema(BaseSchema):
     description = fields.String()
     enabled = fields.Boolean()
     uri = fields.String()
+    digest = fields.String()
+    size_bytes = fields.Integer()
     
     created = fields.DateTime()
     updated = fields.DateTime()
@@ -1,10 +1,17 @@
+from flask import request
 from flask_restx import Resource, Namespace
 from logger import setup_logger
 from werkzeug.datastructures import FileStorage
 from enum import Enum
 from werkzeug.utils import secure_filename
+from xai_resource.file_digest import add_name, read_digest, sha256_file, stream_to_file, write_digest
+import fcntl
+import hashlib
+import json
 import os
 import re
+import time
+import uuid
 
 # file type enum for request validation and swagger documentation
 class FileType(str, Enum):
@@ -12,26 +19,92 @@ class FileType(str, Enum):
     datasource = 'datasource'
 
 # folders and allowed extensions for each FileType
+# files are stored by content, as <sha256>.<extension>, the uploaded names are kept in their metadata
 UPLOAD_FOLDERS = {'datasource':'storage/data', 'model':'storage/models'}
-ALLOWED_EXTENSIONS = {'datasource':['csv'], 'model':['pkl']}
+ALLOWED_EXTENSIONS = {'datasource':['csv', 'parquet'], 'model':['pkl']}
+# partes dos uploads em andamento, <upload_id>.part, e seus metadados, <upload_id>.json
+UPLOAD_SESSIONS_FOLDER = 'storage/uploads'
+# uploads em partes sem nenhuma parte recebida neste tempo, em segundos, sao descartados
+UPLOAD_SESSION_TTL = 24 * 60 * 60
+
+class InvalidUpload(Exception):
+    """ Erro do cliente em um upload, respondido com code """
+
+    def __init__(self, message, code=400):
+        super().__init__(message)
+        self.code = code
 
 def allowed_file(filename, fileType):
     return '.' in filename and \
         filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS[fileType]
 
-def rename_file(filename):
-    # padrao para pegar arquivos terminados em "_dup(QUALQUER NUMERO)", dup se refere a duplicado
-    pattern = r".*_dup\d+$"
-    filename = filename.split('.')
-    rawname = filename[-2]
-    if re.match(pattern, rawname):
-        rawname = rawname.split('_')
-        rawname[-1] = 'dup'+str(int(rawname[-1].replace('dup',''))+1)
-        rawname = '_'.join(rawname)
-    else:
-        rawname = rawname + '_dup1'
-    filename[-2] = rawname
-    return '.'.join(filename)
+def object_uri(digest, filename, fileType):
+    # extensao do nome original, ja validada por allowed_file; secure_filename pode remover o ponto
+    return os.path.join(UPLOAD_FOLDERS[fileType], f"{digest}.{filename.rsplit('.', 1)[1].lower()}")
+
+def stored_object(uri, name, status):
+    digest, size = read_digest(uri)
+    return {'status': status, 'name': name, 'filename': os.path.basename(uri), 'uri': uri,
+            'digest': digest, 'size': size}
+
+def find_object(digest, filename, fileType, size=None):
+    """
+    Arquivo já guardado com o conteúdo de digest, ou None. O nome do upload é adicionado aos seus metadados.
+    """
+    uri = object_uri(digest, filename, fileType)
+    stored_digest, stored_size = read_digest(uri) if os.path.isfile(uri) else (None, None)
+    if stored_digest != digest or (size is not None and stored_size != size):
+        return None
+    # nome sanitizado guardado apenas para exibicao
+    name = secure_filename(filename)
+    add_name(uri, name)
+    return stored_object(uri, name, 'EXISTS')
+
+def store_upload(part_path, filename, fileType, digest, size):
+    """
+    Guarda um arquivo recebido pelo seu conteúdo. Se um arquivo identico já existe ele não é reescrito.
+    """
+    existing = find_object(digest, filename, fileType, size)
+    if existing is not None:
+        return existing, 200
+
+    name = secure_filename(filename)
+    uri = object_uri(digest, filename, fileType)
+    os.replace(part_path, uri)
+    # a copia em Arrow dos csv e criada pela tarefa inspect_datasource, quando o datasource e cadastrado
+    write_digest(uri, digest, size, [name])
+    return stored_object(uri, name, 'UPLOADED'), 201
+
+def session_paths(upload_id):
+    if not re.fullmatch(r'[0-9a-f]{32}', upload_id):
+        raise InvalidUpload(f'Upload {upload_id} inválido')
+    return (os.path.join(UPLOAD_SESSIONS_FOLDER, f'{upload_id}.part'),
+            os.path.join(UPLOAD_SESSIONS_FOLDER, f'{upload_id}.json'))
+
+def expire_sessions(ttl=UPLOAD_SESSION_TTL):
+    """
+    Remove os uploads em partes abandonados, cujo arquivo de metadados (tocado a cada parte) é mais
+    antigo que ttl.
+    """
+    if not os.path.isdir(UPLOAD_SESSIONS_FOLDER):
+        return
+    deadline = time.time() - ttl
+    for name in os.listdir(UPLOAD_SESSIONS_FOLDER):
+        upload_id, ext = os.path.splitext(name)
+        if not re.fullmatch(r'[0-9a-f]{32}', upload_id):
+            continue
+        part_path, info_path = session_paths(upload_id)
+        # a parte sem metadados e de um upload que nao existe mais
+        expired_path = info_path if ext == '.json' else part_path if not os.path.exists(info_path) else None
+        try:
+            if expired_path is None or os.path.getmtime(expired_path) >= deadline:
+                continue
+            for path in (part_path, info_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        except FileNotFoundError:
+            # removido por outro worker
+            continue
 
 ns = Namespace('Uploader', description='Upload de modelos/fontes de dados')
 
@@ -42,6 +115,19 @@ parser.add_argument('type', type=FileType, help='Tipo de arquivo para upload',
 parser.add_argument('file', type=FileStorage, location='files',
                     help='Arquivo para upload', required=True)
 
+session_parser = ns.parser()
+session_parser.add_argument('type', type=FileType, help='Tipo de arquivo para upload',
+                            choices=list(FileType), location='args', required=True)
+session_parser.add_argument('filename', type=str, help='Nome do arquivo', location='args', required=True)
+session_parser.add_argument('size', type=int, help='Tamanho total do arquivo em bytes', location='args',
+                            required=True)
+session_parser.add_argument('digest', type=str, location='args',
+                            help='SHA-256 do arquivo, se já guardado o upload termina sem enviar o arquivo')
+
+chunk_parser = ns.parser()
+chunk_parser.add_argument('Content-Range', type=str, location='headers', required=True,
+                          help='Posição da parte no arquivo: bytes inicio-fim/tamanho')
+
 
 logger = setup_logger()
 
@@ -50,8 +136,9 @@ class Uploader(Resource):
     @ns.expect(parser, validate=True)
     def post(self):
         """
-        Upload de qualquer arquivo CSV e PKL para datasources e mdoelos
+        Upload de qualquer arquivo CSV, Parquet e PKL para datasources e mdoelos
         Verifica strings e salva arquivos dependendo do parâmetro de URL para FileType, também verifica se nome do arquivo que está sendo salvo é seguro.
+        O arquivo é guardado pelo seu SHA-256, reenviar um arquivo idêntico retorna o já guardado com status EXISTS.
         """
         try:
             args = parser.parse_args()
@@ -62,17 +149,135 @@ class Uploader(Resource):
                raise FileNotFoundError("Nenhum arquivo foi enviado utilizando o parâmetro 'file'")
 
             if file and allowed_file(file.filename, fileType):
-                filename = secure_filename(file.filename)
-                uri = os.path.join(UPLOAD_FOLDERS[fileType],filename)
-
-                while os.path.exists(uri):
-                    filename = rename_file(filename)
-                    uri = os.path.join(UPLOAD_FOLDERS[fileType],filename)
-                    
-                file.save(uri)
-                return {'status': 'UPLOADED', 'filename': filename, 'uri': uri}, 201
+                # gravado em partes, com o SHA-256 calculado durante a copia
+                part_path = os.path.join(UPLOAD_FOLDERS[fileType], f'.{uuid.uuid4().hex}.part')
+                hasher = hashlib.sha256()
+                try:
+                    with open(part_path, 'wb') as f:
+                        size = stream_to_file(file.stream, f, hasher)
+                    return store_upload(part_path, file.filename, fileType, hasher.hexdigest(), size)
+                finally:
+                    if os.path.exists(part_path):
+                        os.remove(part_path)
             else:
                 raise TypeError(f'A extensão utilizada não é permitida para o tipo de arquivo {fileType}. São permitidas as seguintes: {ALLOWED_EXTENSIONS[fileType]}')
         except Exception as e:
             logger.error(f"[{self.__class__.__name__}] Um erro ocorreu: {e}")
-            return {"error": f"[{self.__class__.__name__}] Um erro ocorreu ao processar a requisição.", "message": str(e)}, 500
\ No newline at end of file
+            return {"error": f"[{self.__class__.__name__}] Um erro ocorreu ao processar a requisição.", "message": str(e)}, 500
+
+@ns.route('/session')
+class UploadSession(Resource):
+    @ns.expect(session_parser, validate=True)
+    def post(self):
+        """
+        Inicia um upload em partes, que pode ser retomado
+        As partes são enviadas em ordem com PUT em /session/<upload_id>, cada uma com o cabeçalho Content-Range.
+        Se o digest informado é de um arquivo já guardado ele é retornado e nenhuma parte precisa ser enviada.
+        """
+        try:
+            args = session_parser.parse_args()
+            expire_sessions()
+            if not allowed_file(args['filename'], args['type']):
+                raise InvalidUpload(f'A extensão utilizada não é permitida para o tipo de arquivo {args["type"]}. '
+                                f'São permitidas as seguintes: {ALLOWED_EXTENSIONS[args["type"]]}')
+
+            if args['digest']:
+                if not re.fullmatch(r'[0-9a-f]{64}', args['digest'].lower()):
+                    raise InvalidUpload(f'Digest {args["digest"]} inválido, deve ser um SHA-256 em hexadecimal')
+                existing = find_object(args['digest'].lower(), args['filename'], args['type'], args['size'])
+                if existing is not None:
+                    return existing, 200
+
+            upload_id = uuid.uuid4().hex
+            part_path, info_path = session_paths(upload_id)
+            os.makedirs(UPLOAD_SESSIONS_FOLDER, exist_ok=True)
+            open(part_path, 'wb').close()
+            with open(info_path, 'w') as f:
+                json.dump({'filename': args['filename'], 'type': args['type'].value, 'size': args['size']}, f)
+            return {'status': 'CREATED', 'upload_id': upload_id, 'offset': 0}, 201
+        except InvalidUpload as e:
+            return {'status': 'ERROR', 'message': str(e)}, e.code
+        except Exception as e:
+            logger.error(f"[{self.__class__.__name__}] Um erro ocorreu: {e}")
+            return {"error": f"[{self.__class__.__name__}] Um erro ocorreu ao processar a requisição.", "message": str(e)}, 500
+
+@ns.route('/session/<string:upload_id>')
+class UploadSessionChunk(Resource):
+    def get(self, upload_id):
+        """
+        Retorna quantos bytes do upload já foram recebidos, de onde o envio deve ser retomado
+        """
+        try:
+            part_path, info_path = session_paths(upload_id)
+            if not os.path.isfile(info_path):
+                return {'status': 'ERROR', 'message': f'Upload {upload_id} não existe'}, 404
+            with open(info_path) as f:
+                info = json.load(f)
+            return {'status': 'IN_PROGRESS', 'upload_id': upload_id, 'offset': os.path.getsize(part_path),
+                    'size': info['size']}, 200
+        except InvalidUpload as e:
+            return {'status': 'ERROR', 'message': str(e)}, e.code
+        except Exception as e:
+            logger.error(f"[{self.__class__.__name__}] Um erro ocorreu: {e}")
+            return {"error": f"[{self.__class__.__name__}] Um erro ocorreu ao processar a requisição.", "message": str(e)}, 500
+
+    @ns.expect(chunk_parser)
+    def put(self, upload_id):
+        """
+        Recebe a próxima parte de um upload no corpo da requisição
+        A parte deve começar no offset já recebido. Ao receber o último byte o arquivo é salvo e seu digest retornado.
+        """
+        try:
+            part_path, info_path = session_paths(upload_id)
+            if not os.path.isfile(info_path):
+                return {'status': 'ERROR', 'message': f'Upload {upload_id} não existe'}, 404
+            with open(info_path) as f:
+                info = json.load(f)
+
+            content_range = re.fullmatch(r'bytes (\d+)-(\d+)/(\d+)', request.headers.get('Content-Range', ''))
+            if content_range is None:
+                raise InvalidUpload('Cabeçalho Content-Range ausente ou inválido')
+            start, end, total = (int(value) for value in content_range.groups())
+            if total != info['size']:
+                raise InvalidUpload(f'O tamanho do arquivo é {info["size"]} bytes, não {total}', 416)
+            if end < start or end >= total:
+                raise InvalidUpload(f'Parte {start}-{end} fora do arquivo de {total} bytes', 416)
+
+            try:
+                f = open(part_path, 'r+b')
+            except FileNotFoundError:
+                return {'status': 'ERROR', 'message': f'Upload {upload_id} não existe'}, 404
+
+            with f:
+                # uma parte de cada upload por vez, entre todos os processos
+                fcntl.flock(f, fcntl.LOCK_EX)
+                if not os.path.isfile(info_path):
+                    return {'status': 'ERROR', 'message': f'Upload {upload_id} não existe'}, 404
+                # mantem o upload vivo para expire_sessions
+                os.utime(info_path)
+                offset = f.seek(0, os.SEEK_END)
+                if start != offset:
+                    return {'status': 'ERROR', 'message': f'A parte deve começar no byte {offset}',
+                            'upload_id': upload_id, 'offset': offset}, 409
+
+                offset += stream_to_file(request.stream, f)
+                if offset > info['size']:
+                    f.truncate(start)
+                    raise InvalidUpload(f'Foram recebidos {offset} bytes de um arquivo de {info["size"]} bytes', 416)
+
+                if offset < info['size']:
+                    return {'status': 'IN_PROGRESS', 'upload_id': upload_id, 'offset': offset}, 202
+
+                # as partes podem ter sido recebidas por processos diferentes, o arquivo e hasheado uma vez no fim
+                f.flush()
+                digest = sha256_file(part_path).hexdigest()
+                result = store_upload(part_path, info['filename'], FileType(info['type']), digest, offset)
+                for path in (part_path, info_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                return result
+        except InvalidUpload as e:
+            return {'status': 'ERROR', 'message': str(e)}, e.code
+        except Exception as e:
+            logger.error(f"[{self.__class__.__name__}] Um erro ocorreu: {e}")
+            return {"error": f"[{self.__class__.__name__}] Um erro ocorreu ao processar a requisição.", "message": str(e)}, 500
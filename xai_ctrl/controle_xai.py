@@ -1,7 +1,9 @@
-import hashlib
+import os
 
 from DAO.model_dao import ModelDAO
 from DAO.datasource_dao import DataSourceDAO
+from explainable_ai.explainer_cache import ExplainerCache
+from xai_resource.file_digest import read_digest, sha256_file
 from logger import setup_logger
 
 logging = setup_logger()
@@ -50,13 +52,31 @@ class CtrXAI:
 
 class DigestXAI:
 
+    # digests already computed in this process, keyed by (path, modification time, size)
+    _digests = {}
+
     def __init__(self, file_path):
         self.file_path = file_path
 
+    def cached_digest(self):
+        stat = os.stat(self.file_path)
+        file_id = (os.path.abspath(self.file_path), stat.st_mtime_ns, stat.st_size)
+        if file_id not in DigestXAI._digests:
+            # digest stored when the file was uploaded, hashed again only when it is missing
+            DigestXAI._digests[file_id] = read_digest(self.file_path)[0] or self.create_digest()
+        return DigestXAI._digests[file_id]
+
+    @staticmethod
+    def explainer_cache_key(model_path, data_path):
+        """
+        Key of the explainers built for a model and a datasource, used by ExplainerCache.
+        """
+        return ExplainerCache.make_key(DigestXAI(model_path).cached_digest(),
+                                       DigestXAI(data_path).cached_digest())
+
     def create_digest(self):
-        with open(self.file_path, 'rb') as f:
-            binary_data = f.read()
-        return hashlib.sha256(binary_data).hexdigest()
+        # hashed chunk by chunk, so memory does not grow with the file
+        return sha256_file(self.file_path).hexdigest()
 
     def verify_model(self, original_digest):
 
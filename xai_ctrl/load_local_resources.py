@@ -1,6 +1,8 @@
 from logger import setup_logger
-import pandas as pd
 from pathlib import Path
+from explainable_ai.data_profile import DataProfile
+from xai_resource.columnar_cache import read_csv_datasource
+from xai_resource.parquet_datasource import read_parquet_datasource
 
 logger = setup_logger()
 
@@ -29,14 +31,29 @@ class XaiLoadLocalResources:
             raise NotImplementedError(error_msg)
 
 
-    def get_data(self, data_name):
+    def get_data(self, data_name, columns=None, **parquet_kwargs):
+        """
+        :param columns: Columns to load, usually the features and the target (see datasource_columns),
+        all of them if None.
+        :param parquet_kwargs: row_groups, filters, sample_fraction and random_state of
+        read_parquet_datasource, for parquet datasources.
+        """
         if self.data_is_local:
-            if data_name.endswith(".csv"):
+            if data_name.endswith((".csv", ".parquet")):
                 data_path = Path('./storage/data') / data_name
                 if not data_path.is_file():
                     logger.error(f'{self.__class__.__name__} doesn\'t know how to load {data_name}')
                     raise FileNotFoundError(f'{self.__class__.__name__} doesn\'t know how to load {data_name}')
-                return pd.read_csv(data_path, index_col=False)
+                if data_name.endswith(".parquet"):
+                    return read_parquet_datasource(data_path, columns, **parquet_kwargs)
+                return read_csv_datasource(data_path, columns)
         else:
             logger.error(f'{self.__class__.__name__} doesn\'t know how to load {data_name}')
             raise NotImplementedError(f'{self.__class__.__name__} doesn\'t know how to load {data_name}')
+
+    def get_profile(self, data_name):
+        if self.data_is_local:
+            return DataProfile.load_for(Path('./storage/data') / data_name)
+        else:
+            logger.error(f'{self.__class__.__name__} doesn\'t know how to load the profile of {data_name}')
+            raise NotImplementedError(f'{self.__class__.__name__} doesn\'t know how to load the profile of {data_name}')
@@ -0,0 +1,110 @@
+import os
+import threading
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import csv
+
+from .inspect_datasource import infer_csv_arrow_schema
+
+# Arrow IPC file kept next to each csv datasource
+ARROW_SUFFIX = '.arrow'
+# bytes of csv parsed into each record batch of the Arrow file
+BLOCK_BYTES = 1 << 24
+
+
+def arrow_path_for(uri):
+    return str(uri) + ARROW_SUFFIX
+
+
+def has_arrow_cache(path):
+    """
+    True if the Arrow file of the csv at path exists and is not older than the csv.
+    """
+    arrow_path = arrow_path_for(path)
+    return os.path.isfile(arrow_path) and os.path.getmtime(arrow_path) >= os.path.getmtime(path)
+
+
+def cache_schema(path):
+    """
+    Arrow schema of the Arrow file of the csv at path: the one infer_csv_schema gives the datasource,
+    with the columns empty in the sample read as strings instead of nulls.
+    """
+    schema = infer_csv_arrow_schema(path)
+    return pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                      for field in schema])
+
+
+def write_arrow_cache(path, block_bytes=BLOCK_BYTES):
+    """
+    Convert the csv at path into a typed Arrow IPC file next to it, streaming block_bytes of csv
+    at a time. Every block is read with the column types of cache_schema.
+
+    :return: The path of the Arrow file.
+    """
+    arrow_path = arrow_path_for(path)
+    tmp_path = f'{arrow_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    schema = cache_schema(path)
+    reader = csv.open_csv(path, read_options=csv.ReadOptions(block_size=block_bytes),
+                          convert_options=csv.ConvertOptions(column_types=schema))
+    try:
+        with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+        os.replace(tmp_path, arrow_path)
+    finally:
+        reader.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return arrow_path
+
+
+def ensure_arrow_cache(path, **kwargs):
+    """
+    Write the Arrow file of the csv at path unless an up to date one already exists.
+    """
+    if not has_arrow_cache(path):
+        write_arrow_cache(path, **kwargs)
+    return arrow_path_for(path)
+
+
+def read_arrow_cache(path, columns=None):
+    """
+    Read the Arrow file of the csv at path into a pandas DataFrame. The file is memory-mapped and
+    only columns (all of them if None) are converted, without copying the numeric columns twice.
+    """
+    with pa.memory_map(arrow_path_for(path)) as source:
+        table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select(list(columns))
+    return table.to_pandas(split_blocks=True)
+
+
+def iter_arrow_cache(path, columns=None):
+    """
+    Yield the Arrow file of the csv at path as pandas DataFrames, one per record batch.
+    """
+    with pa.memory_map(arrow_path_for(path)) as source:
+        reader = pa.ipc.open_file(source)
+        if columns is not None:
+            indices = [reader.schema.get_field_index(col) for col in columns]
+            if -1 in indices:
+                raise KeyError(f"Columns not found in {path}: {[col for col, j in zip(columns, indices) if j == -1]}")
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if columns is not None:
+                # RecordBatch.select is missing from older pyarrow releases
+                batch = pa.RecordBatch.from_arrays([batch.column(j) for j in indices], names=list(columns))
+            yield batch.to_pandas(split_blocks=True)
+
+
+def read_csv_datasource(path, columns=None):
+    """
+    Read a csv datasource from its Arrow file when it is up to date, from the csv otherwise.
+    Columns come in the order of columns.
+    """
+    if has_arrow_cache(path):
+        return read_arrow_cache(path, columns)
+    if columns is None:
+        return pd.read_csv(path, index_col=False)
+    return pd.read_csv(path, index_col=False, usecols=columns)[list(columns)]
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+
+# bytes read or written at a time when streaming a file
+CHUNK_BYTES = 1 << 20
+# SHA-256 digest, size and original names of a stored file, written next to it when the file is stored
+DIGEST_SUFFIX = '.sha256.json'
+
+
+def digest_path_for(uri):
+    return str(uri) + DIGEST_SUFFIX
+
+
+def sha256_file(path, chunk_bytes=CHUNK_BYTES, hasher=None, start=0):
+    """
+    SHA-256 of a file read chunk_bytes at a time, optionally continuing hasher from start.
+
+    :return: The hasher, holding the digest of the file.
+    """
+    hasher = hasher or hashlib.sha256()
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while chunk := f.read(chunk_bytes):
+            hasher.update(chunk)
+    return hasher
+
+
+def stream_to_file(stream, f, hasher=None, chunk_bytes=CHUNK_BYTES):
+    """
+    Copy a readable stream into the open file f chunk_bytes at a time, updating hasher, if any, with each chunk.
+
+    :return: The number of bytes copied.
+    """
+    size = 0
+    while chunk := stream.read(chunk_bytes):
+        f.write(chunk)
+        if hasher is not None:
+            hasher.update(chunk)
+        size += len(chunk)
+    return size
+
+
+def write_digest(path, digest, size, names=()):
+    """
+    Store the digest, size and names (the file names it was uploaded with) of the file at path next to it.
+    """
+    tmp_path = f'{digest_path_for(path)}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'digest': digest, 'size': size, 'names': sorted(set(names))}, f)
+    os.replace(tmp_path, digest_path_for(path))
+
+
+def read_names(path):
+    """
+    Names the file at path was uploaded with.
+    """
+    if not os.path.isfile(digest_path_for(path)):
+        return []
+    with open(digest_path_for(path)) as f:
+        return json.load(f).get('names', [])
+
+
+def add_name(path, name):
+    """
+    Record one more name of the file at path, keeping its stored digest.
+    """
+    digest, size = read_digest(path)
+    if digest is not None and name not in read_names(path):
+        write_digest(path, digest, size, read_names(path) + [name])
+
+
+def read_digest(path):
+    """
+    Stored digest and size of the file at path, or (None, None) when they are missing or older
+    than the file.
+    """
+    stored = digest_path_for(path)
+    if not os.path.isfile(stored) or os.path.getmtime(stored) < os.path.getmtime(path):
+        return None, None
+    with open(stored) as f:
+        info = json.load(f)
+    if info.get('size') != os.path.getsize(path):
+        return None, None
+    return info['digest'], info['size']
+
+
+def file_digest(path):
+    """
+    Digest and size of the file at path, from the stored digest when it is up to date, otherwise
+    hashed chunk by chunk and stored.
+    """
+    digest, size = read_digest(path)
+    if digest is None:
+        digest, size = sha256_file(path).hexdigest(), os.path.getsize(path)
+        write_digest(path, digest, size, read_names(path))
+    return digest, size
@@ -0,0 +1,46 @@
+import os
+
+from pyarrow import csv
+
+# bytes read from the head of a csv file to infer its schema and estimate its number of rows
+SAMPLE_BYTES = 1 << 20
+
+
+def infer_csv_arrow_schema(path, sample_bytes=SAMPLE_BYTES):
+    """
+    Infer the Arrow schema of a csv file from its first sample_bytes only, with the streaming Arrow
+    csv reader.
+    """
+    reader = csv.open_csv(path, read_options=csv.ReadOptions(block_size=sample_bytes))
+    try:
+        return reader.schema
+    finally:
+        reader.close()
+
+
+def infer_csv_schema(path, sample_bytes=SAMPLE_BYTES):
+    """
+    Infer the pandas dtype of each column of a csv file from its first sample_bytes only.
+
+    :return: A dictionary of column name to pandas dtype string, in file order.
+    """
+    dtypes = infer_csv_arrow_schema(path, sample_bytes).empty_table().to_pandas().dtypes
+    return {col: str(dtype) for col, dtype in dtypes.to_dict().items()}
+
+
+def estimate_csv_rows(path, sample_bytes=SAMPLE_BYTES):
+    """
+    Estimate the number of rows of a csv file from the line length of its first sample_bytes,
+    exact when the file is smaller than sample_bytes.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        head = f.read(sample_bytes)
+    lines = head.count(b'\n') + (0 if not head or head.endswith(b'\n') else 1)
+    if len(head) == size:
+        return max(lines - 1, 0)
+    header = head.find(b'\n') + 1
+    if header == 0 or lines < 2:
+        return None
+    return round((lines - 1) * (size - header) / (len(head) - header))
+
@@ -1,10 +1,21 @@
 from logger import setup_logger
-import pandas as pd
 import pickle
+import ast
 from pyarrow import fs
+from explainable_ai.data_profile import DataProfile
+from xai_resource.columnar_cache import read_csv_datasource
+from xai_resource.parquet_datasource import read_parquet_datasource
 
 logger = setup_logger()
 
+
+def datasource_columns(datasource):
+    """
+    Feature and target columns of a registered datasource, the columns its explanations load.
+    """
+    return list(ast.literal_eval(datasource.features)) + list(ast.literal_eval(datasource.target))
+
+
 class XaiLoadResource:
 
     def __init__(self, data_is_local=False, model_is_local=False):
@@ -25,13 +36,28 @@ class XaiLoadResource:
                 rd = stream.readall()
             return rd
 
-    def get_data(self, data_name):
+    def get_data(self, data_name, columns=None, **parquet_kwargs):
+        """
+        :param columns: Columns to load, usually the features and the target (see datasource_columns),
+        all of them if None.
+        :param parquet_kwargs: row_groups, filters, sample_fraction and random_state of
+        read_parquet_datasource, for parquet datasources.
+        """
         if self.data_is_local:
             if data_name.endswith(".csv"):
                 data_path = '/storage/data/' + data_name
-                df = pd.read_csv(data_path, index_col=False)
+                df = read_csv_datasource(data_path, columns)
                 return df
+            if data_name.endswith(".parquet"):
+                data_path = '/storage/data/' + data_name
+                return read_parquet_datasource(data_path, columns, **parquet_kwargs)
         else:
             logger.error(f"class {self.__class__.__name__} doesnt know how to load {data_name}")
             raise NotImplementedError(f"class {self.__class__.__name__} doesnt know how to load {data_name}")
 
+    def get_profile(self, data_name):
+        if self.data_is_local:
+            return DataProfile.load_for('/storage/data/' + data_name)
+        else:
+            logger.error(f"class {self.__class__.__name__} doesnt know how to load the profile of {data_name}")
+            raise NotImplementedError(f"class {self.__class__.__name__} doesnt know how to load the profile of {data_name}")
@@ -0,0 +1,58 @@
+import numpy as np
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+def infer_parquet_schema(path):
+    """
+    Pandas dtype of each column of a parquet file, read from its footer.
+
+    :return: A dictionary of column name to pandas dtype string, in file order.
+    """
+    dtypes = pq.read_schema(path).empty_table().to_pandas().dtypes
+    return {col: str(dtype) for col, dtype in dtypes.to_dict().items()}
+
+
+def count_parquet_rows(path):
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def sample_row_groups(path, fraction, random_state=None):
+    """
+    Indices of a uniform sample of the row groups of a parquet file, at least one of them.
+    """
+    n_row_groups = pq.ParquetFile(path).metadata.num_row_groups
+    size = min(max(int(round(fraction * n_row_groups)), 1), n_row_groups)
+    return sorted(np.random.default_rng(random_state).choice(n_row_groups, size=size, replace=False).tolist())
+
+
+def read_parquet_datasource(path, columns=None, row_groups=None, filters=None, sample_fraction=None,
+                            random_state=None):
+    """
+    Read a parquet datasource into a pandas DataFrame decoding only what is asked for.
+
+    :param columns: Columns to read, in this order, all of them if None.
+    :param row_groups: Indices of the row groups to read, all of them if None.
+    :param filters: Row filters in the pyarrow/pandas format, e.g. [('age', '>', 30)] or a list of
+    such lists (OR of ANDs). Row groups whose statistics exclude the filters are skipped.
+    :param sample_fraction: If defined and row_groups is None, read this fraction of the row groups,
+    picked at random, instead of the whole file.
+    :param random_state: Seed of the row group sample.
+    """
+    if row_groups is None and sample_fraction is not None:
+        row_groups = sample_row_groups(path, sample_fraction, random_state)
+
+    fragment = next(ds.dataset(path, format='parquet').get_fragments())
+    if row_groups is not None:
+        fragment = fragment.subset(row_group_ids=list(row_groups))
+    expression = pq.filters_to_expression(filters) if filters else None
+    table = fragment.to_table(columns=list(columns) if columns is not None else None, filter=expression)
+    return table.to_pandas(split_blocks=True)
+
+
+def iter_parquet_datasource(path, columns=None, batch_size=100_000):
+    """
+    Yield a parquet datasource as pandas DataFrames of at most batch_size rows.
+    """
+    for batch in pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=batch_size, columns=columns):
+        yield batch.to_pandas(split_blocks=True)